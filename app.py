@@ -1,13 +1,14 @@
 import os
 import time
+import random
 import glob
 import sqlite3
 import logging
 from functools import wraps
 from types import SimpleNamespace
-from typing import Callable, Any, List, Optional
+from typing import Callable, Any, Dict, List, Optional
 
-from flask import Flask, render_template, g, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Response, render_template, g, request, redirect, url_for, flash, session, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from markdown_it import MarkdownIt
@@ -17,7 +18,62 @@ from dotenv import load_dotenv
 from config import get_config
 from extensions import db
 from models import User, Category, Book, Order, OrderItem, Payment
-from utils.markdown import render_markdown_safe
+from utils.markdown import render_markdown_cached
+from utils.covers import CoverIngestWorker, mark_cover_skipped
+from utils.workers import should_start_workers
+from utils.db import close_db, get_db, install_engine_hooks, is_sqlite, raw_connection
+from utils.book_page import load_book_page, refresh_review_html, refresh_review_stats, render_review_html
+from utils.challenges import ChallengeProgressWorker
+from utils.hydrate import EntityHydrator
+from utils.shelves import load_shelves
+from utils.user_stats import (
+    SHELF_COUNTERS,
+    USER_STATS_SCHEMA,
+    UserStatsReconciler,
+    bump_review_count,
+    bump_user_stats,
+    get_user_stats,
+    reconcile_user_stats,
+)
+from utils.feed import FEED_SCHEMA, backfill_inboxes, follow_inbox, load_feed, record_activity, unfollow_inbox
+from utils.inventory import (
+    INVENTORY_SCHEMA,
+    InventoryProjector,
+    reconcile_ledger,
+    record_movement,
+    record_order_movements,
+    record_stock_set,
+    refresh_low_stock,
+    stock_at,
+)
+from utils.scores import BookScoreWorker, refresh_book_scores, trending_candidates, pick_trending
+from utils.search import BM25_EXPR, build_match_query, ensure_search_index, search_books, search_index_available
+from utils.pagination import (
+    count_cache_key,
+    decode_cursor,
+    encode_cursor,
+    order_by_sql,
+    seek_params,
+    seek_sql,
+    sort_key_sql,
+    supports_keyset,
+)
+from utils.cart import (
+    CHECKOUT_REQUESTS_SCHEMA,
+    checkout_order_for,
+    claim_checkout_token,
+    complete_checkout_token,
+    new_checkout_token,
+    price_cart,
+    reserve_stock,
+)
+from utils.cart_store import CARTS_SCHEMA, make_cart_store, new_cart_id
+from utils.categories import CategoryMap
+from utils.images import AvatarIndex
+from utils.promotions import PROMOTION_KINDS, PROMOTION_SCOPES, PROMOTIONS_SCHEMA, PromotionIndex, normalize_coupon
+from utils.orders import ORDER_STATUSES, export_csv, export_ndjson, iter_order_export, list_orders
+from utils.sales import DAILY_SALES_SCHEMA, apply_order_sales, load_sales_dashboard, rebuild_daily_sales, sync_order_status
+from utils.cache import cache_aside, cached_section, invalidate_sections, BOOK_SECTIONS, REVIEW_SECTIONS, SCORE_SECTIONS, USER_SECTIONS
 
 BASE_DIR = os.path.dirname(__file__)
 DB_PATH = os.path.join(BASE_DIR, "books.db")
@@ -101,12 +157,85 @@ def create_app(config_name=None) -> Flask:
     
     # Initialize extensions (ORM, cache, limiter, CSRF, ...)
     _init_extensions(app)
+    # one pooled engine for ORM and raw SQL; PRAGMAs on every new SQLite connection
+    install_engine_hooks(app)
+    with app.app_context():
+        sqlite_engine = is_sqlite()
+    if not sqlite_engine:
+        logger.warning(
+            "DATABASE_URL is not SQLite: background workers, challenge progress, FTS search and the "
+            "SQLite bootstrap are off; SQLite-only raw SQL raises utils.db.SQLiteOnlyError"
+        )
+    # the workers run SQLite SQL on raw pooled connections
+    start_workers = sqlite_engine and should_start_workers(app)
+
+    # Background cover ingestion: request handlers never download images
+    app.cover_worker = None
+    if app.config.get("COVER_WORKER_ENABLED") and start_workers:
+        app.cover_worker = CoverIngestWorker(app, interval=app.config.get("COVER_WORKER_INTERVAL", 60)).start()
+
+    # Periodic full refresh of book_scores (time-decayed terms)
+    app.book_score_worker = None
+    if app.config.get("BOOK_SCORES_WORKER_ENABLED") and start_workers:
+        app.book_score_worker = BookScoreWorker(app, interval=app.config.get("BOOK_SCORES_REFRESH_INTERVAL", 3600)).start()
+
+    # Book-view events -> challenge progress, applied in batches off the GET path
+    app.challenge_worker = ChallengeProgressWorker(
+        app,
+        interval=app.config.get("CHALLENGE_WORKER_INTERVAL", 5),
+        fanout_limit=app.config.get("FEED_FANOUT_MAX_FOLLOWERS", 1000),
+    )
+    if app.config.get("CHALLENGE_WORKER_ENABLED") and start_workers:
+        app.challenge_worker.start()
+
+    # Inventory ledger -> low_stock projection, refreshed after checkouts
+    app.inventory_projector = InventoryProjector(
+        app,
+        interval=app.config.get("INVENTORY_WORKER_INTERVAL", 30),
+        threshold=app.config.get("LOW_STOCK_THRESHOLD", 5),
+    )
+    if app.config.get("INVENTORY_WORKER_ENABLED") and start_workers:
+        app.inventory_projector.start()
+
+    # Periodic recount of user_stats (counters are also updated by the routes)
+    app.user_stats_worker = None
+    if app.config.get("USER_STATS_WORKER_ENABLED") and start_workers:
+        app.user_stats_worker = UserStatsReconciler(app, interval=app.config.get("USER_STATS_RECONCILE_INTERVAL", 3600)).start()
+
+    @app.before_request
+    def _flash_challenge_notices():
+        uid = session.get("user_id")
+        if uid:
+            titles = app.challenge_worker.pop_notices(uid)
+            if titles:
+                flash(f"🎉 Chúc mừng! Bạn đã hoàn thành thử thách: {', '.join(titles)}")
+
+    # Full-text search (books_fts, created by _ensure_database_exists); LIKE fallback without FTS5
+    app.search_fts = False
+    if sqlite_engine:
+        with app.app_context():
+            _conn = raw_connection()
+            try:
+                app.search_fts = search_index_available(_conn)
+            except sqlite3.Error:
+                pass
+            finally:
+                _conn.close()
+
+    # category id <-> name, reloaded after admin category changes
+    app.category_map = CategoryMap(app.config.get("CATEGORY_MAP_MAX_AGE", 300))
+    # active promotions compiled per process, reloaded after admin promotion changes
+    app.promotions = PromotionIndex(app.config.get("PROMOTIONS_MAX_AGE", 60))
+    app.entities = EntityHydrator(app.config.get("BOOK_CARD_CACHE_SIZE", 2048), app.config.get("BOOK_CARD_MAX_AGE", 300))
 
-    def get_db():
-        if "db" not in g:
-            g.db = sqlite3.connect(app.config["DATABASE"])  # type: ignore[attr-defined]
-            g.db.row_factory = sqlite3.Row  # type: ignore[attr-defined]
-        return g.db  # type: ignore[attr-defined]
+    def _wake_cover_worker():
+        if app.cover_worker is not None:
+            app.cover_worker.wake()
+
+    # server-side carts (the session cookie only holds the cart id)
+    app.cart_store = make_cart_store(
+        app.config.get("CART_BACKEND", "sqlite"), get_db, app.config.get("CART_COUNT_MAX_AGE", 60)
+    )
 
     # --- security helpers: tokens / email ---
     from itsdangerous import URLSafeTimedSerializer
@@ -175,55 +304,17 @@ def create_app(config_name=None) -> Flask:
         except Exception:
             pass
 
-    def _download_cover_if_external(url: str) -> str:
-        """If url starts with http/https, try to download into static/uploads and return local path (/static/uploads/xxx).
-        On failure or if url already local, return original url."""
-        if not url:
-            return url
-        u = url.strip()
-        if not (u.startswith('http://') or u.startswith('https://')):
-            return u
-        _ensure_uploads_dir()
-        try:
-            import requests
-            from urllib.parse import urlparse
-            resp = requests.get(u, timeout=8)
-            if resp.status_code != 200 or not resp.content:
-                return u
-            parsed = urlparse(u)
-            # derive filename
-            name = os.path.basename(parsed.path) or f"cover_{int(time.time())}.jpg"
-            safe = secure_filename(name)
-            # ensure extension
-            ext = safe.rsplit('.', 1)[-1].lower() if '.' in safe else 'jpg'
-            if ext not in ALLOWED_IMAGE_EXT:
-                ext = 'jpg'
-                safe = f"{safe}.{ext}" if '.' not in safe else safe
-            dest_name = safe
-            dest_path = os.path.join(UPLOADS_DIR, dest_name)
-            # avoid overwrite by appending counter
-            base, dot, ex = dest_name.rpartition('.')
-            i = 1
-            while os.path.exists(dest_path):
-                dest_name = f"{base}_{i}.{ex}"
-                dest_path = os.path.join(UPLOADS_DIR, dest_name)
-                i += 1
-            with open(dest_path, 'wb') as f:
-                f.write(resp.content)
-            return '/static/uploads/' + dest_name
-        except Exception:
-            return u
+    app.avatar_index = AvatarIndex(
+        AVATAR_DIR,
+        size=app.config.get("AVATAR_CACHE_SIZE", 4096),
+        max_age=app.config.get("AVATAR_CACHE_MAX_AGE", 300),
+    )
 
     def _find_avatar_filename(user_id: int) -> Optional[str]:
-        # look for files like 42.png, 42.jpg etc
-        pattern = os.path.join(AVATAR_DIR, f"{user_id}.*")
-        matches = glob.glob(pattern)
-        if not matches:
-            return None
-        # return the basename of the first match
-        return os.path.basename(matches[0])
+        return app.avatar_index.filename(user_id)
 
     def _remove_existing_avatars(user_id: int):
+        app.avatar_index.invalidate(user_id)
         pattern = os.path.join(AVATAR_DIR, f"{user_id}.*")
         for p in glob.glob(pattern):
             try:
@@ -231,11 +322,7 @@ def create_app(config_name=None) -> Flask:
             except Exception:
                 pass
 
-    @app.teardown_appcontext
-    def close_db(exception):
-        db = g.pop("db", None)
-        if db is not None:
-            db.close()
+    app.teardown_appcontext(close_db)
 
     # ensure uploads dir exists at startup
     _ensure_uploads_dir()
@@ -265,6 +352,13 @@ def create_app(config_name=None) -> Flask:
             [(book_id, tid) for tid in tag_ids],
         )
 
+    def _review_book_ids(db: sqlite3.Connection, review_ids: List[int]) -> List[int]:
+        if not review_ids:
+            return []
+        qmarks = ",".join(["?"] * len(review_ids))
+        rows = db.execute(f"SELECT DISTINCT book_id FROM reviews WHERE id IN ({qmarks})", review_ids).fetchall()
+        return [r[0] for r in rows]
+
     # ---------------- Auth helpers (hoisted) ----------------
     def login_required(view_func: Callable[..., Any]):
         @wraps(view_func)
@@ -287,8 +381,21 @@ def create_app(config_name=None) -> Flask:
             return view_func(*args, **kwargs)
         return wrapped
 
-    @app.route("/")
-    def home():
+    # ---------------- Home page sections (cached) ----------------
+    def _home_ttl(section: str) -> int:
+        ttls = app.config.get("HOME_SECTION_TTLS") or {}
+        return ttls.get(section, app.config.get("CACHE_DEFAULT_TIMEOUT", 300))
+
+    def _invalidate_home(sections) -> None:
+        invalidate_sections(app.cache, sections)
+
+    def _record_activity(db, user_id: int, activity_type: str, target_id, target_type, metadata=None) -> int:
+        return record_activity(
+            db, user_id, activity_type, target_id, target_type, metadata,
+            fanout_limit=app.config.get("FEED_FANOUT_MAX_FOLLOWERS", 1000),
+        )
+
+    def _load_latest_books() -> List[SimpleNamespace]:
         db = get_db()
         # fetch newest
         rows = db.execute(
@@ -310,28 +417,23 @@ def create_app(config_name=None) -> Flask:
                 ).fetchall()
             rows = list(rows) + list(extra)
 
-        # Normalize covers (download external to local once) and ensure description fallbacks
+        # External covers are shown as-is until the cover worker has stored them locally
         latest_books: List[dict] = []
         for r in rows:
-            cover = _download_cover_if_external(r["cover_url"]) if r["cover_url"] else None
             latest_books.append({
                 "id": r["id"],
                 "title": r["title"],
                 "author": r["author"],
-                "cover_url": cover,
+                "cover_url": r["cover_url"],
                 "genre": r["genre"],
                 "description": r["description"] or "",
                 "book_code": r["book_code"],
             })
-        latest_books = [SimpleNamespace(**item) for item in latest_books]
+        return [SimpleNamespace(**item) for item in latest_books]
 
-        # Guarantee at least 2 slides by duplicating the first when only one item
-        if len(latest_books) == 1:
-            latest_books.append(latest_books[0])
-
-        # Topic sections
+    def _load_top_week() -> List[SimpleNamespace]:
         # Top week: by approved reviews in last 7 days
-        top_week = db.execute(
+        rows = get_db().execute(
             """
             SELECT b.id, b.title, b.author, b.cover_url, COALESCE(b.genre,'Khác') as genre, b.description, b.book_code,
                    COUNT(r.id) as reviews_count
@@ -343,55 +445,26 @@ def create_app(config_name=None) -> Flask:
             LIMIT 8
             """
         ).fetchall()
-        top_week = [SimpleNamespace(**dict(r)) for r in top_week]
+        return [SimpleNamespace(**dict(r)) for r in rows]
 
-        # Trending section
-        trending = db.execute(
-            """
-            WITH book_metrics AS (
-                SELECT b.id, b.title, b.author, b.cover_url, COALESCE(b.genre,'Khác') as genre, b.description, b.book_code,
-                       -- Điểm bookmark (30 ngày gần đây)
-                       COALESCE(bookmark_score, 0) as bookmark_score,
-                       -- Điểm review (tất cả thời gian)
-                       COALESCE(review_score, 0) as review_score,
-                       -- Điểm mới (sách mới có ưu tiên)
-                       CASE WHEN datetime(b.created_at) >= datetime('now','-7 day') THEN 10
-                            WHEN datetime(b.created_at) >= datetime('now','-30 day') THEN 5
-                            ELSE 0 END as newness_score,
-                       -- Điểm đa dạng thể loại (random để tránh tập trung 1 thể loại)
-                       (ABS(RANDOM()) % 100) as diversity_score
-                FROM books b
-                LEFT JOIN (
-                    SELECT book_id, COUNT(*) * 2 as bookmark_score
-                    FROM bookmarks 
-                    WHERE datetime(created_at) >= datetime('now','-30 day')
-                    GROUP BY book_id
-                ) bm ON b.id = bm.book_id
-                LEFT JOIN (
-                    SELECT book_id, COUNT(*) * 1.5 as review_score
-                    FROM reviews 
-                    WHERE status = 'approved'
-                    GROUP BY book_id
-                ) rv ON b.id = rv.book_id
-                WHERE (b.is_active IS NULL OR b.is_active=1)
-            )
-            SELECT id, title, author, cover_url, genre, description, book_code,
-                   (bookmark_score + review_score + newness_score + diversity_score) as total_score
-            FROM book_metrics
-            ORDER BY total_score DESC, RANDOM()
-            LIMIT 8
-            """
-        ).fetchall()
-        trending = [SimpleNamespace(**dict(r)) for r in trending]
+    def _load_trending() -> List[dict]:
+        # Candidate set read from the precomputed book_scores table; jitter is applied per request
+        return trending_candidates(get_db(), app.config.get("TRENDING_CANDIDATES", 40))
 
-        genres = db.execute("SELECT DISTINCT COALESCE(genre,'Khác') AS g FROM books ORDER BY g").fetchall()
+    def _load_genres() -> List[str]:
+        rows = get_db().execute("SELECT DISTINCT COALESCE(genre,'Khác') AS g FROM books ORDER BY g").fetchall()
+        return [row[0] for row in rows]
 
-        # Get dynamic stats
-        total_reviews = db.execute("SELECT COUNT(1) FROM reviews WHERE status='approved'").fetchone()[0]
-        total_users = db.execute("SELECT COUNT(1) FROM users").fetchone()[0]
+    def _load_stats() -> dict:
+        db = get_db()
+        return {
+            "total_reviews": db.execute("SELECT COUNT(1) FROM reviews WHERE status='approved'").fetchone()[0],
+            "total_users": db.execute("SELECT COUNT(1) FROM users").fetchone()[0],
+        }
 
-        # Get featured reviews (3 random approved reviews with high ratings)
-        featured_reviews = db.execute(
+    def _load_featured_pool() -> List[dict]:
+        # Pool of high-rated approved reviews; 3 are sampled per request in Python
+        rows = get_db().execute(
             """
             SELECT r.reviewer, r.rating, r.content, r.created_at,
                    b.title as book_title, b.cover_url,
@@ -400,18 +473,36 @@ def create_app(config_name=None) -> Flask:
             JOIN books b ON r.book_id = b.id
             WHERE r.status = 'approved' AND r.rating >= 4
             ORDER BY RANDOM()
-            LIMIT 3
+            LIMIT 30
             """
         ).fetchall()
+        return [dict(r) for r in rows]
+
+    @app.route("/")
+    def home():
+        # Each section is cached on its own; a full hit never touches the database
+        latest_books = list(cached_section(app.cache, "latest", _load_latest_books, _home_ttl("latest")))
+
+        # Guarantee at least 2 slides by duplicating the first when only one item
+        if len(latest_books) == 1:
+            latest_books.append(latest_books[0])
+
+        top_week = cached_section(app.cache, "top_week", _load_top_week, _home_ttl("top_week"))
+        trending_pool = cached_section(app.cache, "trending", _load_trending, _home_ttl("trending"))
+        trending = [SimpleNamespace(**b) for b in pick_trending(trending_pool, 8)]
+        genres = cached_section(app.cache, "genres", _load_genres, _home_ttl("genres"))
+        stats = cached_section(app.cache, "stats", _load_stats, _home_ttl("stats"))
+        featured_pool = cached_section(app.cache, "featured", _load_featured_pool, _home_ttl("featured"))
+        featured_reviews = random.sample(featured_pool, min(3, len(featured_pool)))
 
         return render_template(
             "index.html",
             latest_books=latest_books,
-            genres=[row[0] for row in genres],
+            genres=genres,
             top_week=top_week,
             trending=trending,
-            total_reviews=total_reviews,
-            total_users=total_users,
+            total_reviews=stats["total_reviews"],
+            total_users=stats["total_users"],
             featured_reviews=featured_reviews,
         )
 
@@ -426,7 +517,7 @@ def create_app(config_name=None) -> Flask:
         pages_max = (request.args.get("pages_max") or "").strip()
         date_from = (request.args.get("date_from") or "").strip()
         date_to = (request.args.get("date_to") or "").strip()
-        sort = request.args.get("sort") or "new"
+        sort = request.args.get("sort") or ("relevance" if q and app.search_fts else "new")
         try:
             page = max(1, int(request.args.get("page", 1)))
         except ValueError:
@@ -435,13 +526,28 @@ def create_app(config_name=None) -> Flask:
             per_page = max(6, min(24, int(request.args.get("per_page", 9))))
         except ValueError:
             per_page = 9
+        # opaque keyset cursor (see utils/pagination.py); page is then only a label
+        cursor = decode_cursor((request.args.get("cursor") or "").strip(), sort)
 
+        from_sql = "books"
         where = ["(is_active IS NULL OR is_active=1)"]
         params = []
-        if q:
+        if q and app.search_fts:
+            # FTS5 + bm25 rank; diacritic-insensitive ("tu duy" matches "Tư duy")
+            match = build_match_query(q)
+            if match is None:
+                where.append("(0)")
+            else:
+                from_sql = (
+                    f"books JOIN (SELECT rowid AS fts_id, {BM25_EXPR} AS fts_rank "
+                    "FROM books_fts WHERE books_fts MATCH ?) fts ON fts.fts_id = books.id"
+                )
+                params.append(match)
+        elif q:
             where.append("(title LIKE ? OR author LIKE ? OR book_code LIKE ?)")
             like = f"%{q}%"
             params += [like, like, like]
+        category_map = app.category_map
         category_id_param = (request.args.get("category_id") or "").strip()
         selected_category_name = None
         if category_id_param:
@@ -449,14 +555,18 @@ def create_app(config_name=None) -> Flask:
                 cid = int(category_id_param)
                 where.append("(category_id = ?)")
                 params.append(cid)
-                cat_name_row = db.execute("SELECT name FROM categories WHERE id = ?", (cid,)).fetchone()
-                selected_category_name = cat_name_row["name"] if cat_name_row else None
+                selected_category_name = category_map.name_of(db, cid)
             except (ValueError, TypeError):
                 pass
         if selected_genre:
-            # match by category name first, fallback genre field
-            where.append("(category_id IN (SELECT id FROM categories WHERE name = ?) OR genre = ?)")
-            params += [selected_genre, selected_genre]
+            # resolve to a category id up front (indexed); free-text genre only when no such category
+            genre_cid = category_map.id_of(db, selected_genre)
+            if genre_cid is not None:
+                where.append("(category_id = ?)")
+                params.append(genre_cid)
+            else:
+                where.append("(genre = ?)")
+                params.append(selected_genre)
         if publisher:
             where.append("(publisher LIKE ?)")
             params.append(f"%{publisher}%")
@@ -480,35 +590,66 @@ def create_app(config_name=None) -> Flask:
             params.append(date_to)
         where_sql = (" WHERE " + " AND ".join(where)) if where else ""
 
-        if sort == "az":
-            order_sql = " ORDER BY title COLLATE NOCASE ASC"
-        elif sort == "za":
-            order_sql = " ORDER BY title COLLATE NOCASE DESC"
-        elif sort == "price_asc":
-            order_sql = " ORDER BY COALESCE(price, 0) ASC, created_at DESC"
-        elif sort == "price_desc":
-            order_sql = " ORDER BY COALESCE(price, 0) DESC, created_at DESC"
+        keyset = supports_keyset(sort)
+        if keyset:
+            order_sql = order_by_sql(sort)
+        elif sort == "relevance" and from_sql != "books":
+            order_sql = " ORDER BY fts.fts_rank ASC, created_at DESC"
         else:
-            order_sql = " ORDER BY created_at DESC"
-
-        # count total
-        total = db.execute(f"SELECT COUNT(1) AS c FROM books{where_sql}", params).fetchone()["c"]
-        offset = (page - 1) * per_page
-        books = db.execute(
-            f"""SELECT id, title, author, cover_url, description,
-                COALESCE((SELECT name FROM categories c WHERE c.id = books.category_id), COALESCE(genre,'Khác')) as genre,
-                COALESCE(price, 0) as price, COALESCE(stock, 0) as stock
-                FROM books{where_sql}{order_sql} LIMIT ? OFFSET ?""",
-            params + [per_page, offset],
-        ).fetchall()
-        books = [SimpleNamespace(**dict(b)) for b in books]
-        cat_rows = db.execute("SELECT name FROM categories ORDER BY name").fetchall()
+            order_sql = " ORDER BY created_at DESC, id DESC"
+
+        # total per filter signature, cached briefly so paging does not recount
+        total = cache_aside(
+            app.cache,
+            count_cache_key("books:count", [from_sql, where_sql, params]),
+            lambda: db.execute(f"SELECT COUNT(1) AS c FROM {from_sql}{where_sql}", params).fetchone()["c"],
+            app.config.get("BOOKS_COUNT_TTL", 120),
+        )
+        select_sql = f"""SELECT id, title, author, cover_url, description, category_id, genre,
+                COALESCE(price, 0) as price, COALESCE(stock, 0) as stock{", " + sort_key_sql(sort) + " AS sort_key" if keyset else ""}
+                FROM {from_sql}"""
+        if cursor:
+            # seek from the cursor through the (key, id) index; one extra row tells if there is more
+            key, backwards = cursor
+            seek_where = " WHERE " + " AND ".join(where + [seek_sql(sort, backwards)])
+            rows = db.execute(
+                f"{select_sql}{seek_where}{order_by_sql(sort, reverse=backwards)} LIMIT ?",
+                params + seek_params(*key) + [per_page + 1],
+            ).fetchall()
+            more = len(rows) > per_page
+            rows = rows[:per_page]
+            if backwards:
+                rows.reverse()
+                has_prev, has_next = more, True
+            else:
+                has_prev, has_next = True, more
+            page = max(page, 2) if has_prev else 1
+        else:
+            offset = (page - 1) * per_page
+            rows = db.execute(
+                f"{select_sql}{where_sql}{order_sql} LIMIT ? OFFSET ?",
+                params + [per_page + 1, offset],
+            ).fetchall()
+            has_prev, has_next = page > 1, len(rows) > per_page
+            rows = rows[:per_page]
+        next_cursor = prev_cursor = None
+        if keyset and rows:
+            if has_next:
+                next_cursor = encode_cursor(sort, rows[-1]["sort_key"], rows[-1]["id"])
+            if has_prev:
+                prev_cursor = encode_cursor(sort, rows[0]["sort_key"], rows[0]["id"], backwards=True)
+        books = []
+        for b in rows:
+            book = dict(b)
+            book["genre"] = category_map.name_of(db, book["category_id"]) or book["genre"] or "Khác"
+            books.append(SimpleNamespace(**book))
+        categories = category_map.all(db)
         # fallback to genres if categories empty
-        if cat_rows:
-            genres = [r[0] for r in cat_rows]
+        if categories:
+            genres = [c["name"] for c in categories]
         else:
             genres = [r["g"] for r in db.execute("SELECT DISTINCT COALESCE(genre,'Khác') AS g FROM books ORDER BY g").fetchall()]
-        total_pages = (total + per_page - 1) // per_page
+        total_pages = max((total + per_page - 1) // per_page, page + (1 if has_next else 0))
         return render_template(
             "books_list.html",
             books=books,
@@ -526,101 +667,30 @@ def create_app(config_name=None) -> Flask:
             per_page=per_page,
             total=total,
             total_pages=total_pages,
+            has_next=has_next,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+            offset_pages=app.config.get("BOOKS_OFFSET_PAGES", 5),
             genres=genres,
         )
 
     @app.route("/books/<int:book_id>")
     def book_detail(book_id: int):
         db = get_db()
-        book = db.execute(
-            """SELECT id, title, author, cover_url, description, COALESCE(genre,'Khác') as genre,
-               publisher, num_pages, book_code, category_id, COALESCE(price, 0) as price,
-               COALESCE(stock, 0) as stock FROM books WHERE id=? AND (is_active IS NULL OR is_active=1)""",
-            (book_id,),
-        ).fetchone()
-        if not book:
+        page = load_book_page(db, book_id, session.get("user_id"))
+        if page is None:
             flash("Không tìm thấy sách.")
             return redirect(url_for("books_list"))
-        book = SimpleNamespace(**dict(book))
-        reviews = db.execute(
-            "SELECT id, reviewer, rating, content, details, created_at, status FROM reviews WHERE book_id=? AND status='approved' ORDER BY created_at DESC",
-            (book_id,),
-        ).fetchall()
-        # votes count per review
-        review_ids = [r["id"] for r in reviews]
-        votes_map = {}
-        if review_ids:
-            qmarks = ",".join(["?"] * len(review_ids))
-            rows = db.execute(f"SELECT review_id, COUNT(1) as c FROM review_votes WHERE review_id IN ({qmarks}) GROUP BY review_id", review_ids).fetchall()
-            votes_map = {row["review_id"]: row["c"] for row in rows}
-        # comments per review (threaded: parent_id)
-        comments_map = {}
-        if review_ids:
-            qmarks = ",".join(["?"] * len(review_ids))
-            rows = db.execute(f"SELECT id, review_id, parent_id, author, content, created_at FROM review_comments WHERE review_id IN ({qmarks}) ORDER BY created_at ASC", review_ids).fetchall()
-            for row in rows:
-                comments_map.setdefault(row["review_id"], []).append(row)
-        tags = db.execute(
-            "SELECT t.name FROM tags t JOIN book_tags bt ON bt.tag_id=t.id WHERE bt.book_id=? ORDER BY t.name",
-            (book_id,),
-        ).fetchall()
-        avg_row = db.execute("SELECT ROUND(AVG(rating),1) as avg_rating, COUNT(1) as total FROM reviews WHERE book_id=? AND status='approved'", (book_id,)).fetchone()
-        avg_rating = avg_row["avg_rating"] if avg_row and avg_row["avg_rating"] is not None else None
-        total_reviews = avg_row["total"] if avg_row else 0
-        # bookmark state
-        is_bookmarked = False
-        if session.get("user_id"):
-            row = db.execute("SELECT 1 FROM bookmarks WHERE user_id=? AND book_id=?", (session["user_id"], book_id)).fetchone()
-            is_bookmarked = bool(row)
-        
-        # shelf state
-        current_shelf = None
-        if session.get("user_id"):
-            shelf_row = db.execute("SELECT shelf_type FROM user_shelves WHERE user_id=? AND book_id=?", (session["user_id"], book_id)).fetchone()
-            if shelf_row:
-                current_shelf = shelf_row["shelf_type"]
-        
-        # Track book view for challenges (only for logged in users)
+        book = page.book
+        reviews = page.reviews
+        avg_rating = page.avg_rating
+        total_reviews = page.total_reviews
+
+        # Track book view for challenges (only for logged in users); applied by the challenge worker
         if session.get("user_id"):
-            # Check if user has already viewed this book
-            existing_view = db.execute("SELECT 1 FROM book_views WHERE user_id=? AND book_id=?", (session["user_id"], book_id)).fetchone()
-            if not existing_view:
-                # Record the view
-                db.execute("INSERT INTO book_views (user_id, book_id) VALUES (?,?)", (session["user_id"], book_id))
-                
-                # Update challenge progress
-                db.execute("""
-                    UPDATE user_challenges 
-                    SET current_count = current_count + 1 
-                    WHERE user_id = ? AND challenge_id IN (
-                        SELECT id FROM reading_challenges WHERE is_active = 1
-                    )
-                """, (session["user_id"],))
-                
-                # Check for completed challenges
-                completed_challenges = db.execute("""
-                    SELECT uc.challenge_id, rc.title 
-                    FROM user_challenges uc
-                    JOIN reading_challenges rc ON rc.id = uc.challenge_id
-                    WHERE uc.user_id = ? AND uc.current_count >= rc.target_count AND uc.completed_at IS NULL
-                """, (session["user_id"],)).fetchall()
-                
-                # Mark challenges as completed
-                for challenge in completed_challenges:
-                    db.execute("UPDATE user_challenges SET completed_at = CURRENT_TIMESTAMP WHERE user_id = ? AND challenge_id = ?", 
-                              (session["user_id"], challenge["challenge_id"]))
-                    # Add completion to activity feed
-                    db.execute("INSERT INTO user_activities (user_id, activity_type, target_id, target_type, metadata) VALUES (?,?,?,?,?)",
-                              (session["user_id"], 'challenge_complete', challenge["challenge_id"], 'challenge', f'completed challenge: {challenge["title"]}'))
-                
-                db.commit()
-                
-                # Show completion message if any challenges were completed
-                if completed_challenges:
-                    challenge_titles = [c["title"] for c in completed_challenges]
-                    flash(f"🎉 Chúc mừng! Bạn đã hoàn thành thử thách: {', '.join(challenge_titles)}")
-        
-        return render_template("book_detail.html", book=book, reviews=reviews, avg_rating=avg_rating, total_reviews=total_reviews, tags=[r[0] for r in tags], votes_map=votes_map, comments_map=comments_map, render_markdown=render_markdown_safe, is_bookmarked=is_bookmarked, current_shelf=current_shelf, total_readers=total_reviews)
+            app.challenge_worker.record_view(session["user_id"], book_id)
+
+        return render_template("book_detail.html", book=book, reviews=reviews, avg_rating=avg_rating, total_reviews=total_reviews, tags=page.tags, votes_map=page.votes_map, comments_map=page.comments_map, render_markdown=render_markdown_cached, is_bookmarked=page.is_bookmarked, current_shelf=page.current_shelf, total_readers=total_reviews)
 
     @app.route("/books/<int:book_id>/reviews/new")
     def new_review(book_id: int):
@@ -655,96 +725,109 @@ def create_app(config_name=None) -> Flask:
             flash("Không tìm thấy sách.")
             return redirect(url_for("books_list"))
 
-        # reviews default to pending
+        # reviews default to pending; HTML is rendered once here, never on page views
+        content_html, _ = render_review_html(content, None)
         db.execute(
-            "INSERT INTO reviews (book_id, reviewer, rating, content, status) VALUES (?,?,?,?,?)",
-            (book_id, reviewer, rating_int, content, "pending"),
+            "INSERT INTO reviews (book_id, user_id, reviewer, rating, content, content_html, status) VALUES (?,?,?,?,?,?,?)",
+            (book_id, session.get("user_id"), reviewer, rating_int, content, content_html, "pending"),
         )
         db.commit()
         flash("✅ Đã gửi đánh giá thành công, chờ duyệt!")
         return redirect(url_for("book_detail", book_id=book_id))
 
-    # ---------------- Cart helpers (session-based) ----------------
+    # ---------------- Cart helpers (server-side store, id in session) ----------------
+    def _new_cart_id() -> str:
+        cart_id = new_cart_id()
+        if session.get("user_id"):
+            app.cart_store.set_user(cart_id, session["user_id"])
+        session["cart_id"] = cart_id
+        return cart_id
+
+    def _cart_id(create: bool = False) -> Optional[str]:
+        cart_id = session.get("cart_id")
+        legacy = session.pop("cart", None)
+        if legacy:
+            # cart from before the server-side store: move it over once
+            cart_id = cart_id or _new_cart_id()
+            items = app.cart_store.get(cart_id)
+            for bid_str, qty in legacy.items():
+                try:
+                    items[str(int(bid_str))] = items.get(str(int(bid_str)), 0) + int(qty)
+                except (ValueError, TypeError):
+                    pass
+            app.cart_store.replace(cart_id, items)
+            get_db().commit()
+        if cart_id is None and create:
+            cart_id = _new_cart_id()
+        return cart_id
+
     def _get_cart():
-        if "cart" not in session:
-            session["cart"] = {}
-        return session["cart"]
+        """Current cart contents (a copy; write through app.cart_store)."""
+        cart_id = _cart_id()
+        return app.cart_store.get(cart_id) if cart_id else {}
 
     def _cart_count():
-        return sum(int(q) for q in _get_cart().values())
+        return app.cart_store.count(_cart_id())
 
-    def _cart_subtotal():
+    def _priced_cart():
+        """Cart lines priced with one query, memoized on g until the cart changes."""
         cart = _get_cart()
-        if not cart:
-            return 0
-        db_conn = get_db()
-        total = 0
-        for bid_str, qty in cart.items():
-            try:
-                bid = int(bid_str)
-                q = int(qty) or 0
-                if q <= 0:
-                    continue
-                row = db_conn.execute(
-                    "SELECT COALESCE(price, 0) as p FROM books WHERE id=? AND (is_active IS NULL OR is_active=1)",
-                    (bid,),
-                ).fetchone()
-                if row:
-                    total += float(row["p"] or 0) * q
-            except (ValueError, TypeError):
-                pass
-        return total
+        key = tuple(sorted((str(k), str(v)) for k, v in cart.items()))
+        memo = g.get("cart_pricing")
+        if memo is None or memo[0] != key:
+            memo = (key, price_cart(get_db(), cart))
+            g.cart_pricing = memo
+        return memo[1]
 
-    def _shipping_fee(subtotal):
+    def _cart_subtotal():
+        return _priced_cart().subtotal
+
+    def _shipping_fee(subtotal, free_shipping=False):
         threshold = app.config.get("FREE_SHIP_THRESHOLD", 300000)
         fee = app.config.get("SHIPPING_FEE", 30000)
-        return 0 if subtotal >= threshold else fee
+        return 0 if free_shipping or subtotal >= threshold else fee
+
+    def _cart_totals():
+        """Priced cart plus the best promotion (and session coupon), shipping and total."""
+        priced = _priced_cart()
+        promo = app.promotions.apply(get_db(), priced.lines, priced.subtotal, session.get("coupon"))
+        shipping = _shipping_fee(priced.subtotal, promo.free_shipping)
+        return SimpleNamespace(
+            priced=priced,
+            promo=promo,
+            subtotal=priced.subtotal,
+            discount=promo.discount,
+            shipping_fee=shipping,
+            total=priced.subtotal - promo.discount + shipping,
+        )
 
     # ---------------- Cart routes ----------------
     @app.route("/cart")
     def cart_view():
-        cart = _get_cart()
-        items = []
-        db_conn = get_db()
-        for bid_str, qty in list(cart.items()):
-            try:
-                bid = int(bid_str)
-                q = int(qty) or 0
-                if q <= 0:
-                    del cart[bid_str]
-                    continue
-                row = db_conn.execute(
-                    """SELECT id, title, author, cover_url, COALESCE(price, 0) as price,
-                       COALESCE(stock, 0) as stock FROM books WHERE id=? AND (is_active IS NULL OR is_active=1)""",
-                    (bid,),
-                ).fetchone()
-                if not row:
-                    del cart[bid_str]
-                    continue
-                price = float(row["price"] or 0)
-                stock = int(row["stock"] or 0)
-                q = min(q, stock) if stock >= 0 else q
-                if q <= 0:
-                    del cart[bid_str]
-                    continue
-                cart[bid_str] = q
-                items.append({
-                    "id": row["id"],
-                    "title": row["title"],
-                    "author": row["author"],
-                    "cover_url": row["cover_url"],
-                    "price": price,
-                    "stock": stock,
-                    "quantity": q,
-                    "line_total": price * q,
-                })
-            except (ValueError, TypeError):
-                del cart[bid_str]
-        session.modified = True
-        subtotal = sum(i["line_total"] for i in items)
-        shipping = _shipping_fee(subtotal)
-        total = subtotal + shipping
-        return render_template("cart.html", items=items, subtotal=subtotal, shipping_fee=shipping, total=total)
+        totals = _cart_totals()
+        priced = totals.priced
+        # drop invalid lines and clamp quantities to stock in the stored cart too
+        cart_id = _cart_id()
+        if cart_id and priced.quantities != _get_cart():
+            app.cart_store.replace(cart_id, priced.quantities)
+            get_db().commit()
+        return render_template("cart.html", items=priced.lines, subtotal=totals.subtotal, discount=totals.discount,
+                               promo=totals.promo, coupon=session.get("coupon"), shipping_fee=totals.shipping_fee,
+                               total=totals.total, checkout_token=new_checkout_token())
+
+    @app.route("/cart/coupon", methods=["POST"])
+    def cart_coupon():
+        if request.form.get("remove"):
+            session.pop("coupon", None)
+            flash("Đã bỏ mã giảm giá.")
+            return redirect(url_for("cart_view"))
+        code = normalize_coupon(request.form.get("coupon"))
+        if code and app.promotions.has_coupon(get_db(), code):
+            session["coupon"] = code
+            flash(f"Đã áp dụng mã {code}.")
+        else:
+            flash("Mã giảm giá không hợp lệ hoặc đã hết hạn.")
+        return redirect(url_for("cart_view"))
 
     @app.route("/cart/add", methods=["POST"])
     def cart_add():
@@ -765,15 +848,10 @@ def create_app(config_name=None) -> Flask:
             flash("Không tìm thấy sách.")
             return redirect(url_for("books_list"))
         stock = int(row["stock"] or 0)
-        cart = _get_cart()
-        key = str(bid)
-        current = int(cart.get(key, 0))
+        current = int(_get_cart().get(str(bid), 0))
         new_q = min(current + q, stock) if stock >= 0 else current + q
-        if new_q <= 0:
-            cart.pop(key, None)
-        else:
-            cart[key] = new_q
-        session.modified = True
+        app.cart_store.set_quantity(_cart_id(create=True), bid, new_q)
+        db_conn.commit()
         flash("Đã thêm vào giỏ hàng.")
         next_url = request.form.get("next") or request.referrer or url_for("book_detail", book_id=bid)
         return redirect(next_url)
@@ -788,16 +866,13 @@ def create_app(config_name=None) -> Flask:
         except (ValueError, TypeError):
             flash("Dữ liệu không hợp lệ.")
             return redirect(url_for("cart_view"))
-        cart = _get_cart()
-        key = str(bid)
-        if q <= 0:
-            cart.pop(key, None)
-        else:
+        if q > 0:
             db_conn = get_db()
             row = db_conn.execute("SELECT COALESCE(stock, 0) as stock FROM books WHERE id=?", (bid,)).fetchone()
             stock = int(row["stock"] or 0) if row else 0
-            cart[key] = min(q, stock) if stock >= 0 else q
-        session.modified = True
+            q = min(q, stock) if stock >= 0 else q
+        app.cart_store.set_quantity(_cart_id(create=True), bid, q)
+        get_db().commit()
         flash("Đã cập nhật giỏ hàng.")
         return redirect(url_for("cart_view"))
 
@@ -808,9 +883,10 @@ def create_app(config_name=None) -> Flask:
             bid = int(book_id)
         except (ValueError, TypeError):
             return redirect(url_for("cart_view"))
-        cart = _get_cart()
-        cart.pop(str(bid), None)
-        session.modified = True
+        cart_id = _cart_id()
+        if cart_id:
+            app.cart_store.set_quantity(cart_id, bid, 0)
+            get_db().commit()
         flash("Đã xóa khỏi giỏ hàng.")
         return redirect(url_for("cart_view"))
 
@@ -820,82 +896,77 @@ def create_app(config_name=None) -> Flask:
     def checkout():
         if request.method == "GET":
             return redirect(url_for("cart_view"))
+        user_id = session["user_id"]
+        # a repeated POST (double click, retry) gets the order its token already produced
+        token = (request.form.get("checkout_token") or "").strip()[:64] or None
+        existing = checkout_order_for(db.session, token, user_id)
+        if existing:
+            return redirect(url_for("order_detail", order_id=existing))
         cart = _get_cart()
         if not cart:
             flash("Giỏ hàng trống.")
             return redirect(url_for("books_list"))
-        db_conn = get_db()
-        items_data = []
-        for bid_str, qty in cart.items():
-            try:
-                bid = int(bid_str)
-                q = int(qty) or 0
-                if q <= 0:
-                    continue
-                row = db_conn.execute(
-                    "SELECT id, title, COALESCE(price, 0) as price, COALESCE(stock, 0) as stock FROM books WHERE id=? AND (is_active IS NULL OR is_active=1)",
-                    (bid,),
-                ).fetchone()
-                if not row:
-                    continue
-                stock = int(row["stock"] or 0)
-                price = float(row["price"] or 0)
-                q = min(q, stock) if stock >= 0 else q
-                if q <= 0:
-                    continue
-                items_data.append({"book_id": bid, "title": row["title"], "unit_price": price, "quantity": q})
-            except (ValueError, TypeError):
-                pass
+        totals = _cart_totals()
+        items_data = [
+            {"book_id": line["id"], "title": line["title"], "unit_price": line["price"], "quantity": line["quantity"]}
+            for line in totals.priced.lines
+        ]
         if not items_data:
             flash("Không có sản phẩm hợp lệ trong giỏ.")
             return redirect(url_for("cart_view"))
-        subtotal = sum(i["unit_price"] * i["quantity"] for i in items_data)
-        shipping = _shipping_fee(subtotal)
-        total = subtotal + shipping
-        user_id = session["user_id"]
+        subtotal = totals.subtotal
+        shipping = totals.shipping_fee
+        discount = totals.discount
+        total = totals.total
         try:
-            from sqlalchemy import text
+            if not claim_checkout_token(db.session, token, user_id):
+                db.session.rollback()
+                existing = checkout_order_for(db.session, token, user_id)
+                if existing:
+                    return redirect(url_for("order_detail", order_id=existing))
+                return redirect(url_for("my_orders"))
+            # reserve all lines in one statement first, so the write lock is taken late and briefly
+            quantities = {it["book_id"]: it["quantity"] for it in items_data}
+            if not reserve_stock(db.session, quantities):
+                db.session.rollback()
+                flash("Một hoặc nhiều sản phẩm không đủ hàng. Vui lòng cập nhật giỏ và thử lại.")
+                return redirect(url_for("cart_view"))
             order = Order()
             order.user_id = user_id
             order.status = "pending"
             order.subtotal = subtotal
             order.shipping_fee = shipping
-            order.discount = 0
+            order.discount = discount
             order.total = total
             db.session.add(order)
             db.session.flush()
-            for it in items_data:
-                oi = OrderItem()
-                oi.order_id = order.id
-                oi.book_id = it["book_id"]
-                oi.title_snapshot = it["title"]
-                oi.unit_price = it["unit_price"]
-                oi.quantity = it["quantity"]
-                oi.line_total = it["unit_price"] * it["quantity"]
-                db.session.add(oi)
-            # Atomic stock decrement: only update if stock >= quantity to avoid race
-            for it in items_data:
-                result = db.session.execute(
-                    text(
-                        "UPDATE books SET stock = COALESCE(stock, 0) - :q "
-                        "WHERE id = :bid AND COALESCE(stock, 0) >= :q"
-                    ),
-                    {"q": it["quantity"], "bid": it["book_id"]},
-                )
-                if result.rowcount != 1:
-                    db.session.rollback()
-                    flash("Một hoặc nhiều sản phẩm không đủ hàng. Vui lòng cập nhật giỏ và thử lại.")
-                    return redirect(url_for("cart_view"))
-            db.session.flush()
+            db.session.execute(
+                OrderItem.__table__.insert(),
+                [
+                    {
+                        "order_id": order.id,
+                        "book_id": it["book_id"],
+                        "title_snapshot": it["title"],
+                        "unit_price": it["unit_price"],
+                        "quantity": it["quantity"],
+                        "line_total": it["unit_price"] * it["quantity"],
+                    }
+                    for it in items_data
+                ],
+            )
             pay = Payment()
             pay.order_id = order.id
             pay.provider = "cod"
             pay.amount = total
             pay.status = "pending"
             db.session.add(pay)
+            record_order_movements(db.session, order.id, quantities)
+            complete_checkout_token(db.session, token, order.id)
+            apply_order_sales(db.session, order.id)
+            app.cart_store.clear(_cart_id())
             db.session.commit()
-            session["cart"] = {}
-            session.modified = True
+            session.pop("coupon", None)
+            app.inventory_projector.notify()
             flash("Đặt hàng thành công!")
             return redirect(url_for("order_detail", order_id=order.id))
         except Exception as e:
@@ -907,9 +978,15 @@ def create_app(config_name=None) -> Flask:
     @app.route("/orders")
     @login_required
     def my_orders():
-        user_id = session["user_id"]
-        orders_list = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
-        return render_template("orders.html", orders=orders_list)
+        status = (request.args.get("status") or "").strip() or None
+        page = list_orders(
+            user_id=session["user_id"],
+            status=status,
+            cursor=request.args.get("cursor"),
+            limit=app.config.get("ORDERS_PER_PAGE", 20),
+        )
+        return render_template("orders.html", orders=page.orders, status=status, statuses=ORDER_STATUSES,
+                               next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
 
     @app.route("/orders/<int:order_id>")
     @login_required
@@ -929,16 +1006,13 @@ def create_app(config_name=None) -> Flask:
         if uid:
             avatar_file = _find_avatar_filename(uid)
         avatar_url = (url_for('static', filename=f'avatars/{avatar_file}') if avatar_file else None)
-        # Load categories for navbar dropdown (e-commerce)
-        categories = []
-        try:
-            db_conn = get_db()
-            cat_rows = db_conn.execute(
-                "SELECT id, name, slug FROM categories ORDER BY name"
-            ).fetchall()
-            categories = [{"id": r["id"], "name": r["name"], "slug": r["slug"]} for r in cat_rows]
-        except Exception:
-            pass
+        # Categories for navbar dropdown (e-commerce), from the in-process snapshot
+        categories = app.category_map.snapshot()
+        if categories is None:
+            try:
+                categories = app.category_map.all(get_db())
+            except Exception:
+                categories = []
         return {
             "current_user": {
                 "id": uid,
@@ -996,6 +1070,7 @@ def create_app(config_name=None) -> Flask:
                 (username, generate_password_hash(password), "user", email),
             )
             db.commit()
+            _invalidate_home(USER_SECTIONS)
             # send verification email if email provided in username@ form (optional)
             try:
                 token = make_token(username)
@@ -1042,6 +1117,11 @@ def create_app(config_name=None) -> Flask:
             session["user_id"] = user["id"]
             session["username"] = user["username"]
             session["role"] = user["role"]
+            # keep the anonymous cart: merge it into the user's saved cart
+            cart_id = app.cart_store.attach_user(_cart_id(), user["id"])
+            db.commit()
+            if cart_id:
+                session["cart_id"] = cart_id
             next_url = request.args.get("next") or url_for("home")
             return redirect(next_url)
         return render_template("login.html")
@@ -1119,6 +1199,7 @@ def create_app(config_name=None) -> Flask:
         out_name = f"{uid}.{ext}"
         dest = os.path.join(AVATAR_DIR, out_name)
         f.save(dest)
+        app.avatar_index.set(uid, out_name)
         flash('Đã cập nhật avatar.')
         return redirect(url_for('profile'))
 
@@ -1142,17 +1223,16 @@ def create_app(config_name=None) -> Flask:
             (uid,),
         ).fetchall()
         my_reviews = db.execute(
-            "SELECT r.id, r.book_id, r.reviewer, r.rating, r.created_at, b.title as book_title FROM reviews r JOIN books b ON b.id=r.book_id WHERE r.reviewer=? ORDER BY r.created_at DESC",
-            (session.get("username"),),
+            "SELECT r.id, r.book_id, r.reviewer, r.rating, r.created_at, b.title as book_title FROM reviews r JOIN books b ON b.id=r.book_id WHERE r.user_id=? ORDER BY r.created_at DESC",
+            (uid,),
         ).fetchall()
 
         # Get shelf counts
-        want_to_read_count = db.execute("SELECT COUNT(1) FROM user_shelves WHERE user_id=? AND shelf_type='want_to_read'", (uid,)).fetchone()[0]
-        reading_count = db.execute("SELECT COUNT(1) FROM user_shelves WHERE user_id=? AND shelf_type='reading'", (uid,)).fetchone()[0]
-        read_count = db.execute("SELECT COUNT(1) FROM user_shelves WHERE user_id=? AND shelf_type='read'", (uid,)).fetchone()[0]
+        stats = get_user_stats(db, uid)
 
         return render_template("profile.html", user=user, bookmarks=bookmarks, my_reviews=my_reviews,
-                             want_to_read_count=want_to_read_count, reading_count=reading_count, read_count=read_count)
+                             want_to_read_count=stats["shelf_want_to_read"], reading_count=stats["shelf_reading"],
+                             read_count=stats["shelf_read"])
 
     @app.post("/books/<int:book_id>/bookmark")
     @login_required
@@ -1162,12 +1242,16 @@ def create_app(config_name=None) -> Flask:
         existed = db.execute("SELECT 1 FROM bookmarks WHERE user_id=? AND book_id=?", (uid, book_id)).fetchone()
         if existed:
             db.execute("DELETE FROM bookmarks WHERE user_id=? AND book_id=?", (uid, book_id))
+            refresh_book_scores(db, [book_id])
             db.commit()
             flash("✅ Đã bỏ lưu sách thành công!")
         else:
             db.execute("INSERT INTO bookmarks (user_id, book_id) VALUES (?,?)", (uid, book_id))
+            refresh_book_scores(db, [book_id])
             db.commit()
             flash("✅ Đã lưu sách vào mục yêu thích thành công!")
+        # bookmarks feed the trending score
+        _invalidate_home(SCORE_SECTIONS)
         return redirect(url_for("book_detail", book_id=book_id))
 
     # ---------------- Shelf System Routes ----------------
@@ -1198,25 +1282,25 @@ def create_app(config_name=None) -> Flask:
                 # Update existing shelf
                 db.execute("UPDATE user_shelves SET shelf_type=?, added_at=CURRENT_TIMESTAMP WHERE user_id=? AND book_id=?", 
                           (shelf_type, uid, book_id))
+                bump_user_stats(db, uid, **{SHELF_COUNTERS[existing["shelf_type"]]: -1, SHELF_COUNTERS[shelf_type]: 1})
                 db.commit()
                 shelf_names = {"read": "Đã đọc", "reading": "Đang đọc", "want_to_read": "Muốn đọc"}
                 flash(f"✅ Đã chuyển sách sang kệ '{shelf_names[shelf_type]}'!")
                 
                 # Add to activity feed
-                db.execute("INSERT INTO user_activities (user_id, activity_type, target_id, target_type, metadata) VALUES (?,?,?,?,?)",
-                          (uid, 'shelf_move', book_id, 'book', f'moved to {shelf_type}'))
+                _record_activity(db, uid, 'shelf_move', book_id, 'book', f'moved to {shelf_type}')
                 db.commit()
         else:
             # Add to new shelf
             db.execute("INSERT INTO user_shelves (user_id, book_id, shelf_type) VALUES (?,?,?)", 
                       (uid, book_id, shelf_type))
+            bump_user_stats(db, uid, **{SHELF_COUNTERS[shelf_type]: 1})
             db.commit()
             shelf_names = {"read": "Đã đọc", "reading": "Đang đọc", "want_to_read": "Muốn đọc"}
             flash(f"✅ Đã thêm sách vào kệ '{shelf_names[shelf_type]}'!")
             
             # Add to activity feed
-            db.execute("INSERT INTO user_activities (user_id, activity_type, target_id, target_type, metadata) VALUES (?,?,?,?,?)",
-                      (uid, 'shelf_add', book_id, 'book', f'added to {shelf_type}'))
+            _record_activity(db, uid, 'shelf_add', book_id, 'book', f'added to {shelf_type}')
             db.commit()
         
         return redirect(url_for("book_detail", book_id=book_id))
@@ -1232,6 +1316,7 @@ def create_app(config_name=None) -> Flask:
         
         if existing:
             db.execute("DELETE FROM user_shelves WHERE user_id=? AND book_id=?", (uid, book_id))
+            bump_user_stats(db, uid, **{SHELF_COUNTERS.get(existing["shelf_type"], "shelf_read"): -1})
             db.commit()
             flash("✅ Đã xóa sách khỏi kệ!")
         else:
@@ -1239,41 +1324,26 @@ def create_app(config_name=None) -> Flask:
         
         return redirect(url_for("book_detail", book_id=book_id))
 
+    def _shelf_cards(db, shelves) -> Dict[str, List[dict]]:
+        """load_shelves rows -> book cards with added_at, one lookup for all shelves."""
+        cards = app.entities.books(db, (r["book_id"] for rows in shelves.rows.values() for r in rows))
+        return {
+            shelf_type: [dict(cards[r["book_id"]], added_at=r["added_at"]) for r in rows if r["book_id"] in cards]
+            for shelf_type, rows in shelves.rows.items()
+        }
+
     @app.route("/me/shelves")
     @login_required
     def my_shelves():
         db = get_db()
         uid = int(session["user_id"])  # type: ignore[index]
         
-        # Get books from each shelf
-        read_books = db.execute("""
-            SELECT b.id, b.title, b.author, b.cover_url, us.added_at
-            FROM books b
-            JOIN user_shelves us ON b.id = us.book_id
-            WHERE us.user_id = ? AND us.shelf_type = 'read'
-            ORDER BY us.added_at DESC
-        """, (uid,)).fetchall()
-        
-        reading_books = db.execute("""
-            SELECT b.id, b.title, b.author, b.cover_url, us.added_at
-            FROM books b
-            JOIN user_shelves us ON b.id = us.book_id
-            WHERE us.user_id = ? AND us.shelf_type = 'reading'
-            ORDER BY us.added_at DESC
-        """, (uid,)).fetchall()
-        
-        want_to_read_books = db.execute("""
-            SELECT b.id, b.title, b.author, b.cover_url, us.added_at
-            FROM books b
-            JOIN user_shelves us ON b.id = us.book_id
-            WHERE us.user_id = ? AND us.shelf_type = 'want_to_read'
-            ORDER BY us.added_at DESC
-        """, (uid,)).fetchall()
-        
+        # All three shelves in one query
+        books = _shelf_cards(db, load_shelves(db, uid))
         return render_template("my_shelves.html", 
-                             read_books=read_books,
-                             reading_books=reading_books,
-                             want_to_read_books=want_to_read_books)
+                             read_books=books["read"],
+                             reading_books=books["reading"],
+                             want_to_read_books=books["want_to_read"])
 
     # ---------------- Follow System Routes ----------------
     @app.post("/users/<int:user_id>/follow")
@@ -1299,18 +1369,21 @@ def create_app(config_name=None) -> Flask:
         if existing:
             # Unfollow
             db.execute("DELETE FROM user_follows WHERE follower_id=? AND following_id=?", (follower_id, user_id))
+            unfollow_inbox(db, follower_id, user_id)
+            bump_user_stats(db, follower_id, following=-1)
+            bump_user_stats(db, user_id, followers=-1)
             db.commit()
             flash(f"✅ Đã bỏ follow {user['username']}")
         else:
             # Follow
             db.execute("INSERT INTO user_follows (follower_id, following_id) VALUES (?,?)", (follower_id, user_id))
-            db.commit()
-            flash(f"✅ Đã follow {user['username']}")
-            
+            follow_inbox(db, follower_id, user_id, app.config.get("FEED_PAGE_SIZE", 50))
+            bump_user_stats(db, follower_id, following=1)
+            bump_user_stats(db, user_id, followers=1)
             # Add to activity feed
-            db.execute("INSERT INTO user_activities (user_id, activity_type, target_id, target_type, metadata) VALUES (?,?,?,?,?)",
-                      (follower_id, 'follow', user_id, 'user', f'followed {user["username"]}'))
+            _record_activity(db, follower_id, 'follow', user_id, 'user', f'followed {user["username"]}')
             db.commit()
+            flash(f"✅ Đã follow {user['username']}")
         
         return redirect(request.referrer or url_for("home"))
 
@@ -1328,53 +1401,31 @@ def create_app(config_name=None) -> Flask:
             follow_row = db.execute("SELECT 1 FROM user_follows WHERE follower_id=? AND following_id=?", (session["user_id"], user_id)).fetchone()
             is_following = bool(follow_row)
         
-        # Get user's shelves
-        read_books = db.execute("""
-            SELECT b.id, b.title, b.author, b.cover_url, us.added_at
-            FROM books b
-            JOIN user_shelves us ON b.id = us.book_id
-            WHERE us.user_id = ? AND us.shelf_type = 'read'
-            ORDER BY us.added_at DESC LIMIT 6
-        """, (user_id,)).fetchall()
-        
-        reading_books = db.execute("""
-            SELECT b.id, b.title, b.author, b.cover_url, us.added_at
-            FROM books b
-            JOIN user_shelves us ON b.id = us.book_id
-            WHERE us.user_id = ? AND us.shelf_type = 'reading'
-            ORDER BY us.added_at DESC LIMIT 6
-        """, (user_id,)).fetchall()
-        
-        want_to_read_books = db.execute("""
-            SELECT b.id, b.title, b.author, b.cover_url, us.added_at
-            FROM books b
-            JOIN user_shelves us ON b.id = us.book_id
-            WHERE us.user_id = ? AND us.shelf_type = 'want_to_read'
-            ORDER BY us.added_at DESC LIMIT 6
-        """, (user_id,)).fetchall()
-        
+        # Get user's shelves: newest 6 of each plus full counts, one query
+        shelves = load_shelves(db, user_id, per_shelf=6)
+        books = _shelf_cards(db, shelves)
+
         # Get user's recent reviews
         recent_reviews = db.execute("""
             SELECT r.id, r.book_id, r.rating, r.content, r.created_at, b.title as book_title, b.cover_url
             FROM reviews r
             JOIN books b ON b.id = r.book_id
-            WHERE r.reviewer = ? AND r.status = 'approved'
+            WHERE r.user_id = ? AND r.status = 'approved'
             ORDER BY r.created_at DESC LIMIT 5
-        """, (user["username"],)).fetchall()
+        """, (user_id,)).fetchall()
         
-        # Get follow counts
-        followers_count = db.execute("SELECT COUNT(1) FROM user_follows WHERE following_id=?", (user_id,)).fetchone()[0]
-        following_count = db.execute("SELECT COUNT(1) FROM user_follows WHERE follower_id=?", (user_id,)).fetchone()[0]
+        # Follow and review counts (maintained counters)
+        stats = get_user_stats(db, user_id)
         
         return render_template("user_profile.html", 
                              user=user,
                              is_following=is_following,
-                             read_books=read_books,
-                             reading_books=reading_books,
-                             want_to_read_books=want_to_read_books,
+                             read_books=books["read"],
+                             reading_books=books["reading"],
+                             want_to_read_books=books["want_to_read"],
+                             shelf_counts=shelves.counts,
                              recent_reviews=recent_reviews,
-                             followers_count=followers_count,
-                             following_count=following_count)
+                             stats=stats)
 
     @app.route("/me/following")
     @login_required
@@ -1412,49 +1463,10 @@ def create_app(config_name=None) -> Flask:
     @app.route("/feed")
     @login_required
     def activity_feed():
-        db = get_db()
         uid = int(session["user_id"])  # type: ignore[index]
-        
-        # Get activities from users that current user follows
-        activities = db.execute("""
-            SELECT ua.*, u.username, u.id as user_id
-            FROM user_activities ua
-            JOIN users u ON u.id = ua.user_id
-            WHERE ua.user_id IN (
-                SELECT following_id FROM user_follows WHERE follower_id = ?
-            ) OR ua.user_id = ?
-            ORDER BY ua.created_at DESC
-            LIMIT 50
-        """, (uid, uid)).fetchall()
-        
-        # Process activities to get additional data
-        processed_activities = []
-        for activity in activities:
-            activity_data = dict(activity)
-            
-            if activity["activity_type"] == "review" and activity["target_id"]:
-                # Get book info for review activity
-                book = db.execute("SELECT title, cover_url FROM books WHERE id=?", (activity["target_id"],)).fetchone()
-                if book:
-                    activity_data["book_title"] = book["title"]
-                    activity_data["book_cover"] = book["cover_url"]
-            
-            elif activity["activity_type"] in ["shelf_add", "shelf_move"] and activity["target_id"]:
-                # Get book info for shelf activity
-                book = db.execute("SELECT title, cover_url FROM books WHERE id=?", (activity["target_id"],)).fetchone()
-                if book:
-                    activity_data["book_title"] = book["title"]
-                    activity_data["book_cover"] = book["cover_url"]
-            
-            elif activity["activity_type"] == "challenge_complete" and activity["target_id"]:
-                # Get challenge info for completion activity
-                challenge = db.execute("SELECT title FROM reading_challenges WHERE id=?", (activity["target_id"],)).fetchone()
-                if challenge:
-                    activity_data["challenge_title"] = challenge["title"]
-            
-            processed_activities.append(activity_data)
-        
-        return render_template("activity_feed.html", activities=processed_activities)
+        # inbox range read (plus followed pull authors), then batched hydration
+        activities = load_feed(get_db(), uid, app.config.get("FEED_PAGE_SIZE", 50), app.entities)
+        return render_template("activity_feed.html", activities=activities)
 
     # ---------------- Reading Challenges Routes ----------------
     @app.route("/challenges")
@@ -1560,7 +1572,8 @@ def create_app(config_name=None) -> Flask:
     @app.route("/admin")
     @admin_required
     def admin_dashboard():
-        return redirect(url_for("admin_books"))
+        sales = load_sales_dashboard(get_db(), days=app.config.get("SALES_DASHBOARD_DAYS", 30))
+        return render_template("admin/dashboard.html", sales=sales)
 
     # ---------------- Admin: Categories ----------------
     @app.route("/admin/categories")
@@ -1593,6 +1606,7 @@ def create_app(config_name=None) -> Flask:
             i += 1
         db.execute("INSERT INTO categories (name, slug) VALUES (?,?)", (name, slug))
         db.commit()
+        app.category_map.invalidate()
         flash("Đã thêm danh mục thành công.")
         return redirect(url_for("admin_categories"))
 
@@ -1604,9 +1618,86 @@ def create_app(config_name=None) -> Flask:
         db.execute("UPDATE books SET category_id=NULL WHERE category_id=?", (cat_id,))
         db.execute("DELETE FROM categories WHERE id=?", (cat_id,))
         db.commit()
+        app.category_map.invalidate()
         flash("✅ Đã xoá danh mục thành công!")
         return redirect(url_for("admin_categories"))
 
+    # ---------------- Admin: Promotions ----------------
+    @app.route("/admin/promotions")
+    @admin_required
+    def admin_promotions():
+        db = get_db()
+        promos = db.execute(
+            """SELECT p.id, p.name, p.kind, p.value, p.scope, p.target_id, p.coupon_code, p.min_subtotal,
+                      p.starts_at, p.ends_at, p.is_active,
+                      CASE p.scope WHEN 'book' THEN b.title WHEN 'category' THEN c.name END as target_name
+               FROM promotions p
+               LEFT JOIN books b ON p.scope = 'book' AND b.id = p.target_id
+               LEFT JOIN categories c ON p.scope = 'category' AND c.id = p.target_id
+               ORDER BY p.is_active DESC, p.id DESC"""
+        ).fetchall()
+        return render_template("admin_promotions.html", promotions=promos, categories=app.category_map.all(db),
+                               kinds=PROMOTION_KINDS, scopes=PROMOTION_SCOPES)
+
+    @app.route("/admin/promotions/new", methods=["POST"])
+    @admin_required
+    def admin_promotions_new():
+        name = (request.form.get("name") or "").strip()
+        kind = request.form.get("kind")
+        scope = request.form.get("scope") or "all"
+        if not name or kind not in PROMOTION_KINDS or scope not in PROMOTION_SCOPES:
+            flash("Vui lòng nhập đủ tên, loại và phạm vi khuyến mãi.")
+            return redirect(url_for("admin_promotions"))
+        try:
+            value = float(request.form.get("value") or 0)
+            min_subtotal = float(request.form.get("min_subtotal") or 0)
+            target_id = int(request.form.get("target_id")) if scope != "all" else None
+        except (ValueError, TypeError):
+            flash("Giá trị khuyến mãi không hợp lệ.")
+            return redirect(url_for("admin_promotions"))
+        if kind == "percent" and not 0 < value <= 100:
+            flash("Phần trăm giảm phải trong khoảng 1-100.")
+            return redirect(url_for("admin_promotions"))
+
+        def _dt(field):
+            raw = (request.form.get(field) or "").strip()
+            return raw.replace("T", " ") + ":00" if len(raw) == 16 else (raw or None)
+
+        coupon = normalize_coupon(request.form.get("coupon_code"))
+        db = get_db()
+        try:
+            db.execute(
+                """INSERT INTO promotions (name, kind, value, scope, target_id, coupon_code, min_subtotal, starts_at, ends_at)
+                   VALUES (?,?,?,?,?,?,?,?,?)""",
+                (name, kind, value, scope, target_id, coupon, min_subtotal, _dt("starts_at"), _dt("ends_at")),
+            )
+            db.commit()
+        except sqlite3.IntegrityError:
+            flash("Mã giảm giá đã tồn tại.")
+            return redirect(url_for("admin_promotions"))
+        app.promotions.invalidate()
+        flash("Đã thêm khuyến mãi.")
+        return redirect(url_for("admin_promotions"))
+
+    @app.route("/admin/promotions/<int:promo_id>/toggle", methods=["POST"])
+    @admin_required
+    def admin_promotions_toggle(promo_id: int):
+        db = get_db()
+        db.execute("UPDATE promotions SET is_active = 1 - is_active WHERE id=?", (promo_id,))
+        db.commit()
+        app.promotions.invalidate()
+        return redirect(url_for("admin_promotions"))
+
+    @app.route("/admin/promotions/<int:promo_id>/delete", methods=["POST"])
+    @admin_required
+    def admin_promotions_delete(promo_id: int):
+        db = get_db()
+        db.execute("DELETE FROM promotions WHERE id=?", (promo_id,))
+        db.commit()
+        app.promotions.invalidate()
+        flash("✅ Đã xoá khuyến mãi.")
+        return redirect(url_for("admin_promotions"))
+
     # ---------------- Admin: Tags ----------------
     @app.route("/admin/tags")
     @admin_required
@@ -1714,11 +1805,25 @@ def create_app(config_name=None) -> Flask:
             flash("Không thể xóa tài khoản admin.")
             return redirect(url_for("admin_users"))
         # Delete user and related data
+        bookmarked = [r[0] for r in db.execute("SELECT book_id FROM bookmarks WHERE user_id=?", (user_id,)).fetchall()]
         db.execute("DELETE FROM bookmarks WHERE user_id=?", (user_id,))
+        refresh_book_scores(db, bookmarked)
         db.execute("DELETE FROM review_votes WHERE user_id=?", (user_id,))
         db.execute("DELETE FROM review_reports WHERE reporter_user_id=?", (user_id,))
-        db.execute("DELETE FROM users WHERE id=?", (user_id,))
-        db.commit()
+        # the follows go with the user (ON DELETE CASCADE); fix the other side's counters
+        for (followed_id,) in db.execute("SELECT following_id FROM user_follows WHERE follower_id=?", (user_id,)).fetchall():
+            bump_user_stats(db, followed_id, followers=-1)
+        for (follower_id,) in db.execute("SELECT follower_id FROM user_follows WHERE following_id=?", (user_id,)).fetchall():
+            bump_user_stats(db, follower_id, following=-1)
+        try:
+            db.execute("DELETE FROM users WHERE id=?", (user_id,))
+            db.commit()
+        except sqlite3.IntegrityError:
+            # orders keep their customer (foreign keys are enforced)
+            db.rollback()
+            flash("Không thể xóa tài khoản đã có đơn hàng.")
+            return redirect(url_for("admin_users"))
+        _invalidate_home(USER_SECTIONS + (SCORE_SECTIONS if bookmarked else ()))
         flash("✅ Đã xóa tài khoản thành công!")
         return redirect(url_for("admin_users"))
 
@@ -1767,12 +1872,16 @@ f"""## Đánh giá tổng quan\n\nTổng thể, {title} là một lựa chọn x
             details = (
 f"""### Phân tích chi tiết\n\n1. Cấu trúc: Tác phẩm chia thành các chương ngắn, mỗi chương giải quyết một vấn đề cụ thể.\n2. Lập luận: Tác giả sử dụng ví dụ minh họa thuyết phục, có đối chiếu dữ liệu khi cần.\n3. Giá trị tái đọc: Có thể đọc theo chương, tra cứu như sổ tay.\n\n> Trích dẫn ấn tượng: \"Điều quan trọng không phải là thời gian bạn có, mà là chất lượng sự tập trung khi sử dụng thời gian đó.\"\n\n"""
             )
+            content_html, details_html = render_review_html(content, details)
             db.execute(
-                "INSERT INTO reviews (book_id, reviewer, rating, content, details, status) VALUES (?,?,?,?,?,?)",
-                (r["id"], "Hệ thống", 5, content, details, "approved"),
+                "INSERT INTO reviews (book_id, reviewer, rating, content, details, content_html, details_html, status) VALUES (?,?,?,?,?,?,?,?)",
+                (r["id"], "Hệ thống", 5, content, details, content_html, details_html, "approved"),
             )
             inserted += 1
+        refresh_book_scores(db, [r["id"] for r in rows])
+        refresh_review_stats(db, [r["id"] for r in rows])
         db.commit()
+        _invalidate_home(REVIEW_SECTIONS)
         flash(f"✅ Đã tạo {inserted} review mẫu dài cho các sách chưa có review thành công!")
         return redirect(url_for("admin_books"))
 
@@ -1800,6 +1909,7 @@ f"""Điểm đáng giá của {title} nằm ở khả năng cân bằng giữa k
             db.execute("UPDATE books SET description=? WHERE id=?", (long_desc, r["id"]))
             updated += 1
         db.commit()
+        _invalidate_home(BOOK_SECTIONS)
         flash(f"Đã tạo/cập nhật tóm tắt dài cho {updated} sách.")
         return redirect(url_for("admin_books"))
 
@@ -1823,6 +1933,7 @@ f"""Nếu bạn đang tìm một cuốn {genre} vừa dễ đọc vừa giàu gi
         )
         db.execute('UPDATE books SET description=? WHERE id=?', (enhanced, book_id))
         db.commit()
+        _invalidate_home(BOOK_SECTIONS)
         flash('Đã viết lại mô tả dài và hấp dẫn hơn cho sách.')
         return redirect(url_for('admin_books_edit', book_id=book_id))
 
@@ -1844,8 +1955,12 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
         details=(
 """### Gợi ý áp dụng\n\n1) Đọc theo chương, ghi chú 3 ý chính.\n2) Thử một thay đổi nhỏ trong 24 giờ.\n3) Đánh giá kết quả sau 7 ngày và điều chỉnh.\n"""
         )
-        db.execute('INSERT INTO reviews (book_id, reviewer, rating, content, details, status) VALUES (?,?,?,?,?,?)', (book_id, 'Biên tập', 5, content, details, 'approved'))
+        content_html, details_html = render_review_html(content, details)
+        db.execute('INSERT INTO reviews (book_id, reviewer, rating, content, details, content_html, details_html, status) VALUES (?,?,?,?,?,?,?,?)', (book_id, 'Biên tập', 5, content, details, content_html, details_html, 'approved'))
+        refresh_book_scores(db, [book_id])
+        refresh_review_stats(db, [book_id])
         db.commit()
+        _invalidate_home(REVIEW_SECTIONS)
         flash('Đã tạo review biên tập dài cho sách.')
         return redirect(url_for('admin_books_edit', book_id=book_id))
 
@@ -1857,10 +1972,18 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
             details = (request.form.get("details") or "").strip()
             status = (request.form.get("status") or "").strip() or None
             db.execute("UPDATE reviews SET details=?, moderated_at=CURRENT_TIMESTAMP, moderated_by=COALESCE(moderated_by, ?) WHERE id=?", (details or None, session.get("username"), review_id))
+            refresh_review_html(db, [review_id])
             if status in ("approved", "rejected", "pending"):
+                prev = db.execute("SELECT status FROM reviews WHERE id=?", (review_id,)).fetchone()
                 db.execute("UPDATE reviews SET status=? WHERE id=?", (status, review_id))
+                if prev:
+                    _review_status_changed(db, review_id, prev["status"], status)
+                book_ids = _review_book_ids(db, [review_id])
+                refresh_book_scores(db, book_ids)
+                refresh_review_stats(db, book_ids)
             db.execute("INSERT INTO audit_log (action, meta) VALUES (?,?)", ("review_details_updated", f"id={review_id}"))
             db.commit()
+            _invalidate_home(REVIEW_SECTIONS)
             flash("✅ Đã cập nhật chi tiết review thành công!")
             return redirect(url_for("admin_reviews_queue"))
 
@@ -1869,15 +1992,34 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
         if not row:
             flash("Không tìm thấy review.")
             return redirect(url_for("admin_reviews_queue"))
-        return render_template("admin_review_edit.html", review=row, render_markdown=render_markdown_safe)
+        return render_template("admin_review_edit.html", review=row, render_markdown=render_markdown_cached)
+
+    def _review_status_changed(db, review_id: int, prev_status: Optional[str], new_status: str) -> None:
+        """Author's counter and, for a new approval, a feed entry (reviews posted while signed in)."""
+        bump_review_count(db, review_id, prev_status, new_status)
+        if new_status != "approved" or prev_status == "approved":
+            return
+        row = db.execute(
+            "SELECT book_id, rating, user_id FROM reviews WHERE id=? AND user_id IS NOT NULL",
+            (review_id,),
+        ).fetchone()
+        if row:
+            _record_activity(db, row["user_id"], "review", row["book_id"], "book", f"rated {row['rating']}")
 
     @app.post("/admin/reviews/<int:review_id>/approve")
     @admin_required
     def admin_review_approve(review_id: int):
         db = get_db()
+        prev = db.execute("SELECT status FROM reviews WHERE id=?", (review_id,)).fetchone()
         db.execute("UPDATE reviews SET status='approved', moderated_at=CURRENT_TIMESTAMP, moderated_by=? WHERE id=?", (session.get("username"), review_id))
+        if prev:
+            _review_status_changed(db, review_id, prev["status"], "approved")
+        book_ids = _review_book_ids(db, [review_id])
+        refresh_book_scores(db, book_ids)
+        refresh_review_stats(db, book_ids)
         db.execute("INSERT INTO audit_log (action, meta) VALUES (?,?)", ("review_approved", f"id={review_id}"))
         db.commit()
+        _invalidate_home(REVIEW_SECTIONS)
         flash("✅ Đã duyệt review thành công!")
         return redirect(url_for("admin_reviews_queue"))
 
@@ -1886,9 +2028,16 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
     def admin_review_reject(review_id: int):
         db = get_db()
         reason = (request.form.get("reason") or "").strip()
+        prev = db.execute("SELECT status FROM reviews WHERE id=?", (review_id,)).fetchone()
         db.execute("UPDATE reviews SET status='rejected', moderated_at=CURRENT_TIMESTAMP, moderated_by=?, reject_reason=? WHERE id=?", (session.get("username"), reason or None, review_id))
+        if prev:
+            _review_status_changed(db, review_id, prev["status"], "rejected")
+        book_ids = _review_book_ids(db, [review_id])
+        refresh_book_scores(db, book_ids)
+        refresh_review_stats(db, book_ids)
         db.execute("INSERT INTO audit_log (action, meta) VALUES (?,?)", ("review_rejected", f"id={review_id};reason={reason}"))
         db.commit()
+        _invalidate_home(REVIEW_SECTIONS)
         flash("✅ Đã từ chối review thành công!")
         return redirect(url_for("admin_reviews_queue"))
 
@@ -1979,7 +2128,9 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
         db = get_db()
         cur = db.cursor()
         cur.executemany('INSERT INTO books (title, author, cover_url, description) VALUES (?,?,?,?)', demo)
+        refresh_book_scores(db)
         db.commit()
+        _invalidate_home(BOOK_SECTIONS)
         flash('✅ Đã thêm sách demo thành công!')
         return redirect(url_for('admin_books'))
     @app.route('/admin/books/fix-book-codes', methods=['POST'])
@@ -2002,6 +2153,7 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
             db.execute("UPDATE books SET book_code=? WHERE id=?", (code, bid))
             updated += 1
         db.commit()
+        _invalidate_home(BOOK_SECTIONS)
         flash(f'✅ Đã cập nhật mã cho {updated} sách thành công!')
         return redirect(url_for('admin_books'))
 
@@ -2034,26 +2186,15 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
                     cover_url = f"/static/uploads/{unique_filename}"
                     flash(f"✅ Đã upload và lưu hình ảnh: {filename}")
             elif cover_url and cover_url.strip():
+                cover_url = cover_url.strip()
                 # Check if user wants to keep external URL
-                keep_external = request.form.get('keep_external_url')
-                if keep_external:
-                    # Keep original URL without downloading
-                    cover_url = cover_url.strip()
+                if request.form.get('keep_external_url'):
+                    # Keep original URL; the cover worker will not download it
+                    mark_cover_skipped(db, cover_url)
                     flash(f"✅ Đã lưu URL hình ảnh: {cover_url}")
                 else:
-                    # if external URL provided, attempt to download and store locally
-                    try:
-                        original_url = cover_url.strip()
-                        cover_url = _download_cover_if_external(original_url)
-                        if cover_url != original_url:
-                            flash(f"✅ Đã tải và lưu hình ảnh từ URL: {original_url}")
-                        else:
-                            flash(f"✅ Đã lưu URL hình ảnh: {original_url}")
-                    except Exception as e:
-                        print(f"Error downloading cover: {e}")
-                        flash(f"Không thể tải hình ảnh từ URL, đã lưu URL gốc: {cover_url}")
-                        # Keep original URL if download fails
-                        pass
+                    # External URLs are downloaded in the background by the cover worker
+                    flash(f"✅ Đã lưu URL hình ảnh, ảnh bìa sẽ được tải về máy chủ: {cover_url}")
             description = request.form.get("description", "").strip()
             genre = request.form.get("genre", "").strip()
             publisher = request.form.get("publisher", "").strip()
@@ -2104,6 +2245,7 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
                 (title, author, cover_url, description, genre or None, publisher or None, num_pages, book_code, category_id, price, stock, isbn, is_active),
             )
             book_id = int(cur.lastrowid)
+            record_movement(db, book_id, stock)
             # auto-generate book_code if it was None
             if not book_code:
                 gen_code = f"BK{book_id:04d}"
@@ -2114,7 +2256,11 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
                 book_code = gen_code
             tags = _parse_tags_csv(tags_raw)
             _set_book_tags(db, book_id, tags)
+            refresh_book_scores(db, [book_id])
+            refresh_low_stock(db, app.config.get("LOW_STOCK_THRESHOLD", 5), [book_id])
             db.commit()
+            _invalidate_home(BOOK_SECTIONS)
+            _wake_cover_worker()
             flash(f"✅ Đã thêm sách thành công: '{title}' của {author}")
             return redirect(url_for("admin_books"))
         # GET
@@ -2150,25 +2296,15 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
                     cover_url = f"/static/uploads/{unique_filename}"
                     flash(f"✅ Đã upload và lưu hình ảnh: {filename}")
             elif cover_url and cover_url.strip():
+                cover_url = cover_url.strip()
                 # Check if user wants to keep external URL
-                keep_external = request.form.get('keep_external_url')
-                if keep_external:
-                    # Keep original URL without downloading
-                    cover_url = cover_url.strip()
+                if request.form.get('keep_external_url'):
+                    # Keep original URL; the cover worker will not download it
+                    mark_cover_skipped(db, cover_url)
                     flash(f"✅ Đã lưu URL hình ảnh: {cover_url}")
                 else:
-                    try:
-                        original_url = cover_url.strip()
-                        cover_url = _download_cover_if_external(original_url)
-                        if cover_url != original_url:
-                            flash(f"✅ Đã tải và lưu hình ảnh từ URL: {original_url}")
-                        else:
-                            flash(f"✅ Đã lưu URL hình ảnh: {original_url}")
-                    except Exception as e:
-                        print(f"Error downloading cover: {e}")
-                        flash(f"Không thể tải hình ảnh từ URL, đã lưu URL gốc: {cover_url}")
-                        # Keep original URL if download fails
-                        pass
+                    # External URLs are downloaded in the background by the cover worker
+                    flash(f"✅ Đã lưu URL hình ảnh, ảnh bìa sẽ được tải về máy chủ: {cover_url}")
             description = request.form.get("description", "").strip()
             genre = request.form.get("genre", "").strip()
             publisher = request.form.get("publisher", "").strip()
@@ -2217,13 +2353,19 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
                 stock = int(stock_raw) if stock_raw else 0
             except ValueError:
                 stock = 0
+            record_stock_set(db, book_id, stock)
             db.execute(
                 "UPDATE books SET title=?, author=?, cover_url=?, description=?, genre=?, publisher=?, num_pages=?, book_code=?, category_id=?, price=?, stock=?, isbn=?, is_active=? WHERE id=?",
                 (title, author, cover_url, description, genre or None, publisher or None, num_pages, book_code, category_id, price, stock, isbn, is_active, book_id),
             )
             tags = _parse_tags_csv(tags_raw)
             _set_book_tags(db, book_id, tags)
+            refresh_book_scores(db, [book_id])
+            refresh_low_stock(db, app.config.get("LOW_STOCK_THRESHOLD", 5), [book_id])
             db.commit()
+            _invalidate_home(BOOK_SECTIONS)
+            app.entities.invalidate_books([book_id])
+            _wake_cover_worker()
             flash(f"✅ Đã cập nhật sách thành công: '{title}' của {author}")
             return redirect(url_for("admin_books_edit", book_id=book_id))
         # GET
@@ -2263,14 +2405,83 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
         except Exception:
             db_conn.execute("DELETE FROM books WHERE id=?", (book_id,))
             flash("Đã xóa sách thành công!")
+        refresh_book_scores(db_conn, [book_id])
+        refresh_low_stock(db_conn, app.config.get("LOW_STOCK_THRESHOLD", 5), [book_id])
         db_conn.commit()
+        _invalidate_home(BOOK_SECTIONS)
+        app.entities.invalidate_books([book_id])
         return redirect(url_for("admin_books"))
 
     @app.route("/admin/orders")
     @admin_required
     def admin_orders():
-        orders_list = Order.query.order_by(Order.created_at.desc()).all()
-        return render_template("admin/orders.html", orders=orders_list)
+        status = (request.args.get("status") or "").strip() or None
+        page = list_orders(
+            status=status,
+            cursor=request.args.get("cursor"),
+            limit=app.config.get("ADMIN_ORDERS_PER_PAGE", 50),
+        )
+        return render_template("admin/orders.html", orders=page.orders, status=status, statuses=ORDER_STATUSES,
+                               next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
+
+    @app.route("/admin/inventory")
+    @admin_required
+    def admin_inventory():
+        db_conn = get_db()
+        low = db_conn.execute(
+            """SELECT l.book_id, l.stock, l.updated_at, b.title, b.author
+               FROM low_stock l JOIN books b ON b.id = l.book_id
+               ORDER BY l.stock ASC, b.title"""
+        ).fetchall()
+        movements = db_conn.execute(
+            """SELECT m.id, m.book_id, m.delta, m.reason, m.ref_id, m.created_at, b.title
+               FROM inventory_movements m LEFT JOIN books b ON b.id = m.book_id
+               ORDER BY m.id DESC LIMIT 50"""
+        ).fetchall()
+        # point-in-time replay for one book: ?book_id=..&at=YYYY-MM-DDTHH:MM (UTC)
+        replay = None
+        book_id = request.args.get("book_id", type=int)
+        at_raw = (request.args.get("at") or "").strip()
+        if book_id and at_raw:
+            at = at_raw.replace("T", " ")
+            if len(at) == 10:
+                at += " 23:59:59"
+            elif len(at) == 16:
+                at += ":59"
+            replay = {"book_id": book_id, "at": at, "stock": stock_at(db_conn, book_id, at)}
+        return render_template("admin/inventory.html", low=low, movements=movements, replay=replay,
+                               threshold=app.config.get("LOW_STOCK_THRESHOLD", 5))
+
+    @app.route("/admin/orders/export")
+    @admin_required
+    def admin_orders_export():
+        """Streamed CSV/NDJSON of orders: ?from=YYYY-MM-DD&to=YYYY-MM-DD&status=&format=csv|ndjson."""
+        from datetime import datetime
+        fmt = (request.args.get("format") or "csv").lower()
+        if fmt not in ("csv", "ndjson"):
+            fmt = "csv"
+        days = []
+        for arg in ("from", "to"):
+            raw = (request.args.get(arg) or "").strip()
+            try:
+                days.append(datetime.strptime(raw, "%Y-%m-%d").date().isoformat() if raw else None)
+            except ValueError:
+                flash("Ngày không hợp lệ (YYYY-MM-DD).")
+                return redirect(url_for("admin_orders"))
+        chunks = iter_order_export(
+            db.engine.raw_connection,
+            date_from=days[0],
+            date_to=days[1],
+            status=(request.args.get("status") or "").strip() or None,
+            chunk_size=app.config.get("ORDER_EXPORT_CHUNK", 1000),
+        )
+        body = export_csv(chunks) if fmt == "csv" else export_ndjson(chunks)
+        filename = f"orders_{days[0] or 'all'}_{days[1] or 'now'}.{fmt}"
+        return Response(
+            body,
+            mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
 
     @app.route("/admin/orders/<int:order_id>")
     @admin_required
@@ -2283,8 +2494,8 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
     def admin_order_status(order_id: int):
         order = Order.query.get_or_404(order_id)
         new_status = (request.form.get("status") or "").strip()
-        if new_status in ("pending", "paid", "shipped", "canceled"):
-            order.status = new_status
+        if new_status in ORDER_STATUSES:
+            sync_order_status(db.session, order, new_status)
             db.session.commit()
             flash("Đã cập nhật trạng thái đơn hàng.")
         return redirect(url_for("admin_order_detail", order_id=order_id))
@@ -2306,11 +2517,20 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
             from datetime import datetime
             pay.status = "paid"
             pay.paid_at = datetime.utcnow()
-            order.status = "paid"
+            sync_order_status(db.session, order, "paid")
         db.session.commit()
         flash("Đã cập nhật thanh toán.")
         return redirect(url_for("admin_order_detail", order_id=order_id))
 
+    def _text_search(db: sqlite3.Connection, q: str, like: str):
+        """Title/author/description/tag search: FTS5 ranked by bm25, LIKE scan without FTS5."""
+        if app.search_fts:
+            return search_books(db, q, limit=20)
+        return db.execute(
+            'SELECT id, title, author, cover_url, description, genre FROM books WHERE title LIKE ? OR author LIKE ? OR description LIKE ?',
+            (like, like, like),
+        ).fetchall()
+
     @app.route('/api/chat/suggest', methods=['POST'])
     @login_required
     def api_chat_suggest():
@@ -2375,10 +2595,7 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
                 ).fetchall()
                 
                 # Then search in title, author, description
-                text_matches = db.execute(
-                    'SELECT id, title, author, cover_url, description, genre FROM books WHERE title LIKE ? OR author LIKE ? OR description LIKE ?',
-                    (like, like, like),
-                ).fetchall()
+                text_matches = _text_search(db, q, like)
             elif search_strategy.get('priority') == 'genre':
                 # Search by genre first
                 genre_matches = db.execute(
@@ -2387,18 +2604,12 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
                 ).fetchall()
                 
                 # Then search in title, author, description
-                text_matches = db.execute(
-                    'SELECT id, title, author, cover_url, description, genre FROM books WHERE title LIKE ? OR author LIKE ? OR description LIKE ?',
-                    (like, like, like),
-                ).fetchall()
+                text_matches = _text_search(db, q, like)
                 
                 suggestions = genre_matches + text_matches
             else:
                 # Default text search
-                text_matches = db.execute(
-                    'SELECT id, title, author, cover_url, description, genre FROM books WHERE title LIKE ? OR author LIKE ? OR description LIKE ?',
-                    (like, like, like),
-                ).fetchall()
+                text_matches = _text_search(db, q, like)
                 suggestions = text_matches
             
             # Combine results if using tag strategy
@@ -2468,7 +2679,7 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
                 'author': r['author'],
                 'cover_url': r['cover_url'],
                 'short': short,
-                'genre': r.get('genre', ''),
+                'genre': r['genre'] or '',
                 'url': url_for('book_detail', book_id=r['id'])
             })
         
@@ -2520,6 +2731,10 @@ f"""## Kết luận\n\n{desc or f'Tác phẩm mang lại cảm hứng và hướ
 
 
 def _ensure_database_exists():
+    # SQLite bootstrap/migrations only; a Postgres DATABASE_URL uses database_postgresql.sql
+    if not get_config().SQLALCHEMY_DATABASE_URI.startswith("sqlite"):
+        logger.info("DATABASE_URL is not SQLite; skipping the SQLite bootstrap (apply database_postgresql.sql)")
+        return
     created = False
     if not os.path.exists(DB_PATH):
         schema_file = os.path.join(BASE_DIR, "schema.sql")
@@ -2609,6 +2824,11 @@ def _ensure_database_exists():
                 conn.commit()
         except Exception:
             pass
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_genre ON books(genre)")
+    # keyset pagination on /books: one (sort key, id) index per sort option
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_created_id ON books(created_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_title_id ON books(title COLLATE NOCASE, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_price_id ON books(COALESCE(price, 0), id)")
     # dynamic categories and tags schema
     cur.execute("CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, slug TEXT UNIQUE)")
     cur.execute("CREATE TABLE IF NOT EXISTS tags (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, slug TEXT UNIQUE)")
@@ -2619,6 +2839,7 @@ def _ensure_database_exists():
         conn.commit()
     except Exception:
         pass
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_category_id ON books(category_id)")
     # migrate existing genres -> categories and map books.category_id
     try:
         rows = cur.execute("SELECT DISTINCT COALESCE(genre,'Khác') FROM books").fetchall()
@@ -2688,6 +2909,61 @@ def _ensure_database_exists():
         conn.commit()
     except Exception:
         pass
+    # denormalized review stats on books (see utils/book_page.refresh_review_stats)
+    book_cols = [c[1] for c in cur.execute("PRAGMA table_info(books)").fetchall()]
+    if "avg_rating" not in book_cols:
+        cur.execute("ALTER TABLE books ADD COLUMN avg_rating REAL")
+    if "review_count" not in book_cols:
+        cur.execute("ALTER TABLE books ADD COLUMN review_count INTEGER NOT NULL DEFAULT 0")
+    if "avg_rating" not in book_cols or "review_count" not in book_cols:
+        refresh_review_stats(conn)
+        conn.commit()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reviews_book_status_created ON reviews(book_id, status, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_review_comments_review ON review_comments(review_id, created_at)")
+    # rendered review Markdown stored next to the source (see utils/book_page.refresh_review_html)
+    review_cols = [c[1] for c in cur.execute("PRAGMA table_info(reviews)").fetchall()]
+    for col in ("content_html", "details_html"):
+        if col not in review_cols:
+            cur.execute(f"ALTER TABLE reviews ADD COLUMN {col} TEXT")
+    refresh_review_html(conn)
+    conn.commit()
+    # reviews keyed by account; rows from before the column are matched once by username
+    if "user_id" not in review_cols:
+        cur.execute("ALTER TABLE reviews ADD COLUMN user_id INTEGER REFERENCES users(id) ON DELETE SET NULL")
+        cur.execute("UPDATE reviews SET user_id = (SELECT u.id FROM users u WHERE u.username = reviews.reviewer)")
+        conn.commit()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reviews_user_status_created ON reviews(user_id, status, created_at)")
+    # precomputed trending scores, refreshed incrementally by the routes
+    cur.execute("""CREATE TABLE IF NOT EXISTS book_scores (
+        book_id INTEGER PRIMARY KEY,
+        bookmark_score_30d REAL NOT NULL DEFAULT 0,
+        review_score REAL NOT NULL DEFAULT 0,
+        newness REAL NOT NULL DEFAULT 0,
+        base_score REAL NOT NULL DEFAULT 0,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE CASCADE
+    )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_book_scores_base ON book_scores(base_score DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bookmarks_book_created ON bookmarks(book_id, created_at)")
+    refresh_book_scores(conn)
+    conn.commit()
+    # full-text search index over books (FTS5, kept in sync by triggers)
+    ensure_search_index(conn)
+    # external cover downloads handled by the background cover worker
+    cur.execute("""CREATE TABLE IF NOT EXISTS cover_ingest (
+        url TEXT PRIMARY KEY,
+        status TEXT NOT NULL CHECK (status IN ('done', 'failed', 'skipped')),
+        local_path TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        next_attempt_at DATETIME,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""")
+    # server-side carts; anonymous carts untouched for 30 days are dropped
+    cur.executescript(CARTS_SCHEMA)
+    cur.execute("DELETE FROM cart_items WHERE cart_id IN (SELECT id FROM carts WHERE user_id IS NULL AND updated_at < datetime('now','-30 day'))")
+    cur.execute("DELETE FROM carts WHERE user_id IS NULL AND updated_at < datetime('now','-30 day')")
+    conn.commit()
     # audit log
     cur.execute("CREATE TABLE IF NOT EXISTS audit_log (id INTEGER PRIMARY KEY AUTOINCREMENT, action TEXT NOT NULL, meta TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
 
@@ -2720,6 +2996,22 @@ def _ensure_database_exists():
         paid_at DATETIME,
         txn_ref TEXT UNIQUE
     )""")
+    # order listings: keyset on (created_at, id), optionally by status / user
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders(user_id, created_at, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_created_id ON orders(created_at, id)")
+    # sales rollups for the admin dashboard, maintained by checkout / order status changes
+    cur.executescript(DAILY_SALES_SCHEMA)
+    # checkout idempotency tokens; a day is far longer than any retry window
+    cur.executescript(CHECKOUT_REQUESTS_SCHEMA)
+    cur.execute("DELETE FROM checkout_requests WHERE created_at < datetime('now','-1 day')")
+    # promotions (compiled in process by utils/promotions.PromotionIndex)
+    cur.executescript(PROMOTIONS_SCHEMA)
+    # stock ledger; backfilled from / reconciled with books.stock at startup
+    cur.executescript(INVENTORY_SCHEMA)
+    reconcile_ledger(conn)
+    if cur.execute("SELECT 1 FROM daily_sales LIMIT 1").fetchone() is None:
+        rebuild_daily_sales(conn)
     conn.commit()
 
     # user shelves system
@@ -2738,6 +3030,7 @@ def _ensure_database_exists():
     cur.execute("CREATE INDEX IF NOT EXISTS idx_user_shelves_user_id ON user_shelves(user_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_user_shelves_book_id ON user_shelves(book_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_user_shelves_type ON user_shelves(shelf_type)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_user_shelves_user_type_added ON user_shelves(user_id, shelf_type, added_at)")
     
     # user follows system
     cur.execute("""CREATE TABLE IF NOT EXISTS user_follows (
@@ -2771,6 +3064,17 @@ def _ensure_database_exists():
     cur.execute("CREATE INDEX IF NOT EXISTS idx_user_activities_user_id ON user_activities(user_id)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_user_activities_type ON user_activities(activity_type)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_user_activities_created_at ON user_activities(created_at)")
+
+    # per-user feed inboxes (fan-out on write); filled once from existing activities
+    cur.executescript(FEED_SCHEMA)
+    if cur.execute("SELECT 1 FROM feed_inbox LIMIT 1").fetchone() is None:
+        backfill_inboxes(conn, get_config().FEED_FANOUT_MAX_FOLLOWERS)
+        conn.commit()
+
+    # per-user follow/shelf/review counters; recounted here and by UserStatsReconciler
+    cur.executescript(USER_STATS_SCHEMA)
+    reconcile_user_stats(conn)
+    conn.commit()
     
     # reading challenges system
     cur.execute("""CREATE TABLE IF NOT EXISTS reading_challenges (
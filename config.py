@@ -11,17 +11,39 @@ BASE_DIR = Path(__file__).parent.absolute()
 # Database
 DB_PATH = BASE_DIR / "books.db"
 
+
+def _engine_options(uri: str) -> dict:
+    """Pool sizing plus driver settings for the shared SQLAlchemy engine."""
+    options = {
+        "pool_size": int(os.environ.get('DB_POOL_SIZE') or 10),
+        "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW') or 20),
+        "pool_timeout": 30,
+    }
+    if uri.startswith("sqlite"):
+        # seconds to wait while another connection holds the write lock
+        options["connect_args"] = {"timeout": 15, "check_same_thread": False}
+    else:
+        options.update(pool_pre_ping=True, pool_recycle=1800)
+    return options
+
+
 # Flask Configuration
 class Config:
     """Base configuration class."""
     # Security
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     
-    # Database (legacy sqlite path for raw SQL helpers)
+    # Database: one SQLAlchemy engine serves the ORM and raw SQL (utils/db.get_db).
+    # DATABASE is the SQLite file bootstrapped by app._ensure_database_exists;
+    # set DATABASE_URL (postgresql+psycopg2://...) to opt into Postgres, with
+    # the schema from database_postgresql.sql (SQLite-only paths are gated,
+    # see DATABASE_SETUP.md).
     DATABASE = str(DB_PATH)
-    # SQLAlchemy ORM configuration (used for e-commerce features)
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or f"sqlite:///{DB_PATH}"
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # per-connection PRAGMAs on SQLite, merged over utils/db.DEFAULT_SQLITE_PRAGMAS
+    SQLITE_PRAGMAS = {}
     
     # Session
     SESSION_COOKIE_SECURE = os.environ.get('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
@@ -56,14 +78,69 @@ class Config:
     # Caching
     CACHE_TYPE = os.environ.get('CACHE_TYPE', 'simple')
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
+    # Per-section TTLs (seconds) for the home page fragment cache
+    HOME_SECTION_TTLS = {
+        'latest': 300,
+        'top_week': 600,
+        'trending': 300,
+        'genres': 3600,
+        'stats': 120,
+        'featured': 600,
+    }
+    
+    # Background cover ingestion (external cover_url -> static/uploads)
+    COVER_WORKER_ENABLED = os.environ.get('COVER_WORKER_ENABLED', 'True').lower() == 'true'
+    COVER_WORKER_INTERVAL = int(os.environ.get('COVER_WORKER_INTERVAL') or 60)  # seconds
+    
+    # Trending: book_scores full refresh (decay of 30-day / newness terms)
+    BOOK_SCORES_WORKER_ENABLED = os.environ.get('BOOK_SCORES_WORKER_ENABLED', 'True').lower() == 'true'
+    BOOK_SCORES_REFRESH_INTERVAL = int(os.environ.get('BOOK_SCORES_REFRESH_INTERVAL') or 3600)  # seconds
+    TRENDING_CANDIDATES = 40
+    
+    # Book views -> reading challenge progress (batched, off the request path)
+    CHALLENGE_WORKER_ENABLED = os.environ.get('CHALLENGE_WORKER_ENABLED', 'True').lower() == 'true'
+    CHALLENGE_WORKER_INTERVAL = int(os.environ.get('CHALLENGE_WORKER_INTERVAL') or 5)  # seconds
+    
+    # Inventory ledger -> low_stock projection
+    INVENTORY_WORKER_ENABLED = os.environ.get('INVENTORY_WORKER_ENABLED', 'True').lower() == 'true'
+    INVENTORY_WORKER_INTERVAL = int(os.environ.get('INVENTORY_WORKER_INTERVAL') or 30)  # seconds
+    LOW_STOCK_THRESHOLD = 5
+
+    # Activity feed: inbox fan-out on write, pulled at read time above this many followers
+    FEED_FANOUT_MAX_FOLLOWERS = 1000
+    FEED_PAGE_SIZE = 50
+
+    # user_stats counters: periodic recount to absorb writes made outside the routes
+    USER_STATS_WORKER_ENABLED = os.environ.get('USER_STATS_WORKER_ENABLED', 'True').lower() == 'true'
+    USER_STATS_RECONCILE_INTERVAL = int(os.environ.get('USER_STATS_RECONCILE_INTERVAL') or 3600)  # seconds
     
     # Pagination
     BOOKS_PER_PAGE = 9
+    BOOKS_OFFSET_PAGES = 5  # numbered /books links up to here; cursor links beyond
+    BOOKS_COUNT_TTL = 120  # seconds a /books result count is reused per filter set
+    CATEGORY_MAP_MAX_AGE = 300  # seconds before the in-process category map reloads anyway
+    BOOK_CARD_CACHE_SIZE = 2048  # book cards (title, author, cover) kept per process for feeds/shelves
+    BOOK_CARD_MAX_AGE = 300  # seconds before a cached book card is reloaded anyway
+    AVATAR_CACHE_SIZE = 4096  # user -> avatar filename entries kept per process
+    AVATAR_CACHE_MAX_AGE = 300  # seconds before a cached avatar lookup is redone anyway
     REVIEWS_PER_PAGE = 10
+    ORDERS_PER_PAGE = 20
+    ADMIN_ORDERS_PER_PAGE = 50
+    ORDER_EXPORT_CHUNK = 1000  # rows fetched per chunk by /admin/orders/export
+
+    # Admin dashboard: days of daily_sales rollups shown
+    SALES_DASHBOARD_DAYS = 30
+
+    # E-commerce: cart storage ('sqlite' tables, or 'memory' for a single process)
+    CART_BACKEND = os.environ.get('CART_BACKEND', 'sqlite')
+    CART_COUNT_MAX_AGE = 60  # seconds a cached cart badge count is reused
 
     # E-commerce: shipping
     SHIPPING_FEE = 30000  # 30k VND
     FREE_SHIP_THRESHOLD = 300000  # free ship if subtotal > 300k
+
+    # E-commerce: promotions
+    PROMOTIONS_MAX_AGE = 60  # seconds before the in-process promotion index reloads anyway
     
     # Application
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
@@ -86,8 +163,15 @@ class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     DATABASE = str(BASE_DIR / 'test.db')
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{BASE_DIR / 'test.db'}"
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     CACHE_TYPE = 'null'
     WTF_CSRF_ENABLED = False
+    COVER_WORKER_ENABLED = False
+    BOOK_SCORES_WORKER_ENABLED = False
+    CHALLENGE_WORKER_ENABLED = False
+    INVENTORY_WORKER_ENABLED = False
+    USER_STATS_WORKER_ENABLED = False
 
 # Configuration dictionary
 config = {
@@ -52,6 +52,8 @@ CREATE TABLE IF NOT EXISTS books (
     stock INTEGER NOT NULL DEFAULT 0,
     isbn VARCHAR(50) UNIQUE,
     is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    avg_rating DOUBLE PRECISION,
+    review_count INTEGER NOT NULL DEFAULT 0,
     CONSTRAINT ck_books_price_non_negative CHECK (price >= 0),
     CONSTRAINT ck_books_stock_non_negative CHECK (stock >= 0),
     CONSTRAINT ck_books_num_pages_positive CHECK (num_pages IS NULL OR num_pages > 0)
@@ -60,6 +62,7 @@ CREATE TABLE IF NOT EXISTS books (
 CREATE TABLE IF NOT EXISTS reviews (
     id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
     reviewer VARCHAR(255) NOT NULL,
     rating INTEGER NOT NULL,
     content TEXT,
@@ -69,6 +72,8 @@ CREATE TABLE IF NOT EXISTS reviews (
     moderated_by VARCHAR(255),
     reject_reason TEXT,
     created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    content_html TEXT,
+    details_html TEXT,
     CONSTRAINT ck_reviews_rating_range CHECK (rating BETWEEN 1 AND 5),
     CONSTRAINT ck_reviews_status CHECK (status IN ('approved', 'pending', 'rejected'))
 );
@@ -129,7 +134,7 @@ CREATE TABLE IF NOT EXISTS orders (
     discount NUMERIC(10, 2) NOT NULL DEFAULT 0,
     total NUMERIC(10, 2) NOT NULL DEFAULT 0,
     created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT ck_orders_status CHECK (status IN ('pending', 'paid', 'cancelled', 'failed', 'completed')),
+    CONSTRAINT ck_orders_status CHECK (status IN ('pending', 'paid', 'shipped', 'canceled', 'cancelled', 'failed', 'completed')),
     CONSTRAINT ck_orders_subtotal_non_negative CHECK (subtotal >= 0),
     CONSTRAINT ck_orders_shipping_non_negative CHECK (shipping_fee >= 0),
     CONSTRAINT ck_orders_discount_non_negative CHECK (discount >= 0),
@@ -285,6 +290,131 @@ CREATE INDEX IF NOT EXISTS ix_review_reports_review_id ON review_reports(review_
 CREATE INDEX IF NOT EXISTS ix_review_votes_user_id ON review_votes(user_id);
 CREATE INDEX IF NOT EXISTS ix_bookmarks_book_id ON bookmarks(book_id);
 
+-- 5b) Derived and e-commerce support tables (mirrors the SQLite bootstrap in app.py / utils/*)
+-- Not ported: books_fts (SQLite FTS5); search falls back to LIKE when it is missing.
+
+CREATE TABLE IF NOT EXISTS book_scores (
+    book_id INTEGER PRIMARY KEY REFERENCES books(id) ON DELETE CASCADE,
+    bookmark_score_30d DOUBLE PRECISION NOT NULL DEFAULT 0,
+    review_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    newness DOUBLE PRECISION NOT NULL DEFAULT 0,
+    base_score DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS cover_ingest (
+    url TEXT PRIMARY KEY,
+    status VARCHAR(20) NOT NULL CHECK (status IN ('done', 'failed', 'skipped')),
+    local_path TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP WITHOUT TIME ZONE,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS carts (
+    id VARCHAR(64) PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS cart_items (
+    cart_id VARCHAR(64) NOT NULL REFERENCES carts(id) ON DELETE CASCADE,
+    book_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    PRIMARY KEY (cart_id, book_id)
+);
+
+CREATE TABLE IF NOT EXISTS checkout_requests (
+    token VARCHAR(64) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    order_id INTEGER REFERENCES orders(id),
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS daily_sales (
+    day VARCHAR(10) NOT NULL,
+    dimension VARCHAR(10) NOT NULL CHECK (dimension IN ('total', 'book', 'category')),
+    dim_id INTEGER NOT NULL DEFAULT 0,
+    revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, day, dim_id)
+);
+
+CREATE TABLE IF NOT EXISTS inventory_movements (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    delta INTEGER NOT NULL,
+    reason VARCHAR(20) NOT NULL,
+    ref_id INTEGER,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS low_stock (
+    book_id INTEGER PRIMARY KEY REFERENCES books(id) ON DELETE CASCADE,
+    stock INTEGER NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS promotions (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('percent', 'amount', 'free_ship')),
+    value NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    scope VARCHAR(20) NOT NULL DEFAULT 'all' CHECK (scope IN ('all', 'category', 'book')),
+    target_id INTEGER,
+    coupon_code VARCHAR(40) UNIQUE,
+    min_subtotal NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    starts_at TIMESTAMP WITHOUT TIME ZONE,
+    ends_at TIMESTAMP WITHOUT TIME ZONE,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS feed_inbox (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    activity_id INTEGER NOT NULL REFERENCES user_activities(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    PRIMARY KEY (user_id, activity_id)
+);
+
+CREATE TABLE IF NOT EXISTS feed_pull_authors (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    followers INTEGER NOT NULL DEFAULT 0,
+    following INTEGER NOT NULL DEFAULT 0,
+    shelf_read INTEGER NOT NULL DEFAULT 0,
+    shelf_reading INTEGER NOT NULL DEFAULT 0,
+    shelf_want_to_read INTEGER NOT NULL DEFAULT 0,
+    reviews INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_book_scores_base ON book_scores(base_score DESC);
+CREATE INDEX IF NOT EXISTS idx_books_created_id ON books(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_books_price_id ON books((COALESCE(price, 0)), id);
+CREATE INDEX IF NOT EXISTS idx_reviews_book_status_created ON reviews(book_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_reviews_user_status_created ON reviews(user_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_review_comments_review ON review_comments(review_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_bookmarks_book_created ON bookmarks(book_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders(user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_orders_created_id ON orders(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_carts_user ON carts(user_id);
+CREATE INDEX IF NOT EXISTS idx_carts_updated ON carts(updated_at);
+CREATE INDEX IF NOT EXISTS idx_checkout_requests_created ON checkout_requests(created_at);
+CREATE INDEX IF NOT EXISTS idx_inventory_movements_book ON inventory_movements(book_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_user_shelves_user_type_added ON user_shelves(user_id, shelf_type, added_at);
+CREATE INDEX IF NOT EXISTS idx_feed_inbox_user_created ON feed_inbox(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_feed_inbox_activity ON feed_inbox(activity_id);
+CREATE INDEX IF NOT EXISTS idx_user_activities_user_created ON user_activities(user_id, created_at);
+
 -- 6) Seed data (from app.py _ensure_database_exists and default challenge seeds)
 
 INSERT INTO books (title, author, cover_url, description)
@@ -313,6 +443,7 @@ VALUES
 ON CONFLICT DO NOTHING;
 
 -- 7) Additional TODO notes
--- TODO: Current codebase uses mixed sqlite3 raw SQL and SQLAlchemy models.
+-- NOTE: Used when DATABASE_URL points at Postgres; apply it with psql (the app only bootstraps SQLite).
+-- Raw SQL (utils/db.get_db) that is SQLite-only raises utils.db.SQLiteOnlyError there; see DATABASE_SETUP.md.
 -- TODO: Consider creating SQLAlchemy models for reviews/tags/social/challenge tables for single source of truth.
 -- TODO: No dedicated session/token persistence table found in current schema (token appears signed by itsdangerous).
@@ -13,7 +13,7 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False, default="user", index=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
-    orders = db.relationship("Order", back_populates="user", lazy="selectin")
+    orders = db.relationship("Order", back_populates="user", lazy="select")
 
 
 class Category(db.Model):
@@ -47,12 +47,22 @@ class Book(db.Model):
     isbn = db.Column(db.String(50), unique=True)
     is_active = db.Column(db.Boolean, nullable=False, default=True, index=True)
 
+    # Denormalized from approved reviews (refreshed on moderation)
+    avg_rating = db.Column(db.Float)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+
     category = db.relationship("Category", back_populates="books", lazy="joined")
     order_items = db.relationship("OrderItem", back_populates="book")
 
 
 class Order(db.Model):
     __tablename__ = "orders"
+    __table_args__ = (
+        # keyset listing (created_at, id), optionally filtered by status or user
+        db.Index("idx_orders_status_created", "status", "created_at", "id"),
+        db.Index("idx_orders_user_created", "user_id", "created_at", "id"),
+        db.Index("idx_orders_created_id", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
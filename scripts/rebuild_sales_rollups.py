@@ -0,0 +1,36 @@
+"""
+Backfill / repair the daily_sales rollups from the orders tables.
+Run: python scripts/rebuild_sales_rollups.py
+"""
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.chdir(BASE_DIR)
+
+import sqlite3
+from pathlib import Path
+
+from utils.sales import DAILY_SALES_SCHEMA, rebuild_daily_sales
+
+DB_PATH = Path(BASE_DIR) / "books.db"
+
+
+def main():
+    if not DB_PATH.exists():
+        print(f"Database not found at {DB_PATH}")
+        return
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        conn.executescript(DAILY_SALES_SCHEMA)
+        rebuild_daily_sales(conn)
+        conn.commit()
+        days = conn.execute("SELECT COUNT(1) FROM daily_sales WHERE dimension = 'total'").fetchone()[0]
+        print(f"daily_sales rebuilt: {days} days of sales.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
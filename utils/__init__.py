@@ -1,7 +1,7 @@
 """Utility functions for Hybi Books application."""
 from .db import get_db, init_db
 from .auth import login_required, admin_required
-from .markdown import render_markdown_safe
+from .markdown import render_markdown_safe, render_markdown_cached
 from .images import download_cover_if_external, ensure_directories
 
 __all__ = [
@@ -10,6 +10,7 @@ __all__ = [
     'login_required',
     'admin_required',
     'render_markdown_safe',
+    'render_markdown_cached',
     'download_cover_if_external',
     'ensure_directories',
 ]
@@ -0,0 +1,136 @@
+"""Book detail page assembly and denormalized review data (stats, rendered HTML)."""
+import sqlite3
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+
+from .markdown import render_markdown_cached
+
+# Unit separator; tag names never contain it
+_TAG_SEP = "\x1f"
+
+
+def refresh_review_stats(db: sqlite3.Connection, book_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Recompute books.avg_rating / books.review_count from approved reviews.
+
+    Call after a review is approved, rejected or created as approved.
+    Without book_ids the whole catalog is refreshed. The caller commits.
+    """
+    sql = """
+        UPDATE books SET
+            avg_rating = (SELECT ROUND(AVG(rating), 1) FROM reviews r WHERE r.book_id = books.id AND r.status = 'approved'),
+            review_count = (SELECT COUNT(1) FROM reviews r WHERE r.book_id = books.id AND r.status = 'approved')
+    """
+    if book_ids is None:
+        db.execute(sql)
+        return
+    ids = sorted({int(i) for i in book_ids if i is not None})
+    if not ids:
+        return
+    db.execute(sql + f" WHERE id IN ({','.join(['?'] * len(ids))})", ids)
+
+
+def render_review_html(content: Optional[str], details: Optional[str]) -> tuple:
+    """(content_html, details_html) to store next to the Markdown source."""
+    return render_markdown_cached(content or ""), (render_markdown_cached(details) if details else None)
+
+
+def refresh_review_html(db: sqlite3.Connection, review_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Re-render stored review HTML from content/details.
+
+    With review_ids=None only rows without stored HTML are filled (backfill).
+    The caller commits.
+    """
+    if review_ids is None:
+        rows = db.execute(
+            "SELECT id, content, details FROM reviews WHERE content_html IS NULL OR (details IS NOT NULL AND details_html IS NULL)"
+        ).fetchall()
+    else:
+        ids = sorted({int(i) for i in review_ids if i is not None})
+        if not ids:
+            return
+        rows = db.execute(
+            f"SELECT id, content, details FROM reviews WHERE id IN ({','.join(['?'] * len(ids))})", ids
+        ).fetchall()
+    db.executemany(
+        "UPDATE reviews SET content_html=?, details_html=? WHERE id=?",
+        [(*render_review_html(r[1], r[2]), r[0]) for r in rows],
+    )
+
+
+def load_book_page(db: sqlite3.Connection, book_id: int, user_id: Optional[int] = None) -> Optional[SimpleNamespace]:
+    """
+    Everything book_detail renders, in three queries whatever the review count.
+
+    1. the book with its stats, tags and the viewer's bookmark/shelf state
+    2. approved reviews with their vote counts
+    3. comments on those reviews, oldest first (threaded via parent_id)
+
+    Returns None if the book does not exist or is inactive.
+    """
+    row = db.execute(
+        f"""
+        SELECT b.id, b.title, b.author, b.cover_url, b.description, COALESCE(b.genre,'Khác') as genre,
+               b.publisher, b.num_pages, b.book_code, b.category_id, COALESCE(b.price, 0) as price,
+               COALESCE(b.stock, 0) as stock, b.avg_rating, COALESCE(b.review_count, 0) as review_count,
+               (SELECT group_concat(name, '{_TAG_SEP}') FROM (
+                    SELECT t.name FROM tags t JOIN book_tags bt ON bt.tag_id = t.id
+                    WHERE bt.book_id = b.id ORDER BY t.name)) as tag_names,
+               EXISTS (SELECT 1 FROM bookmarks WHERE user_id = :uid AND book_id = b.id) as is_bookmarked,
+               (SELECT shelf_type FROM user_shelves WHERE user_id = :uid AND book_id = b.id) as current_shelf
+        FROM books b
+        WHERE b.id = :book_id AND (b.is_active IS NULL OR b.is_active = 1)
+        """,
+        {"book_id": book_id, "uid": user_id},
+    ).fetchone()
+    if not row:
+        return None
+    data = dict(row)
+    tag_names = data.pop("tag_names")
+    is_bookmarked = bool(data.pop("is_bookmarked"))
+    current_shelf = data.pop("current_shelf")
+
+    reviews = db.execute(
+        """
+        SELECT r.id, r.reviewer, r.rating, r.content, r.details, r.content_html, r.details_html,
+               r.created_at, r.status, COALESCE(v.c, 0) as vote_count
+        FROM reviews r
+        LEFT JOIN (
+            SELECT rv.review_id, COUNT(1) as c
+            FROM review_votes rv JOIN reviews rr ON rr.id = rv.review_id
+            WHERE rr.book_id = ? AND rr.status = 'approved'
+            GROUP BY rv.review_id
+        ) v ON v.review_id = r.id
+        WHERE r.book_id = ? AND r.status = 'approved'
+        ORDER BY r.created_at DESC
+        """,
+        (book_id, book_id),
+    ).fetchall()
+    votes_map: Dict[int, int] = {r["id"]: r["vote_count"] for r in reviews if r["vote_count"]}
+
+    comments_map: Dict[int, List[sqlite3.Row]] = {}
+    if reviews:
+        rows = db.execute(
+            """
+            SELECT c.id, c.review_id, c.parent_id, c.author, c.content, c.created_at
+            FROM review_comments c JOIN reviews r ON r.id = c.review_id
+            WHERE r.book_id = ? AND r.status = 'approved'
+            ORDER BY c.created_at ASC
+            """,
+            (book_id,),
+        ).fetchall()
+        for c in rows:
+            comments_map.setdefault(c["review_id"], []).append(c)
+
+    return SimpleNamespace(
+        book=SimpleNamespace(**data),
+        reviews=reviews,
+        votes_map=votes_map,
+        comments_map=comments_map,
+        tags=tag_names.split(_TAG_SEP) if tag_names else [],
+        avg_rating=data["avg_rating"],
+        total_reviews=data["review_count"],
+        is_bookmarked=is_bookmarked,
+        current_shelf=current_shelf,
+    )
@@ -0,0 +1,55 @@
+"""Section-level caching helpers built on Flask-Caching."""
+import logging
+from typing import Any, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Home page sections and what they depend on
+HOME_SECTIONS = ("latest", "top_week", "trending", "genres", "stats", "featured")
+BOOK_SECTIONS = ("latest", "top_week", "trending", "genres", "featured")
+REVIEW_SECTIONS = ("top_week", "trending", "stats", "featured")
+USER_SECTIONS = ("stats",)
+SCORE_SECTIONS = ("trending",)  # read from book_scores (bookmarks, reviews, views)
+
+
+def section_key(name: str) -> str:
+    return f"home:{name}"
+
+
+def cache_aside(cache, key: str, loader: Callable[[], Any], timeout: Optional[int] = None) -> Any:
+    """
+    Return ``cache[key]``, calling loader() and storing its result on a miss.
+
+    Values must be picklable (dicts / SimpleNamespace, not sqlite3.Row).
+    A None cache (Flask-Caching unavailable) always calls the loader; cache
+    errors are logged and treated as a miss.
+    """
+    if cache is None:
+        return loader()
+    try:
+        value = cache.get(key)
+    except Exception:
+        logger.warning("cache get failed for %s", key)
+        value = None
+    if value is None:
+        value = loader()
+        try:
+            cache.set(key, value, timeout=timeout)
+        except Exception:
+            logger.warning("cache set failed for %s", key)
+    return value
+
+
+def cached_section(cache, name: str, loader: Callable[[], Any], timeout: Optional[int] = None) -> Any:
+    """Return a cached home section, calling loader() only on a miss."""
+    return cache_aside(cache, section_key(name), loader, timeout)
+
+
+def invalidate_sections(cache, names: Iterable[str]) -> None:
+    """Drop the given home sections so the next request reloads them."""
+    if cache is None:
+        return
+    try:
+        cache.delete_many(*[section_key(n) for n in names])
+    except Exception:
+        logger.warning("cache invalidation failed for %s", list(names))
@@ -0,0 +1,157 @@
+"""Cart pricing, stock reservation and checkout idempotency."""
+import secrets
+import sqlite3
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+# one row per checkout attempt token; order_id is set in the same transaction as the order
+CHECKOUT_REQUESTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkout_requests (
+    token TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    order_id INTEGER REFERENCES orders(id),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_checkout_requests_created ON checkout_requests(created_at);
+"""
+
+
+def price_cart(db: sqlite3.Connection, cart: Dict[str, int]) -> SimpleNamespace:
+    """
+    Price a cart ({book_id: quantity}) against current books rows.
+
+    Loads all books with a single ``WHERE id IN (...)``. Quantities are
+    clamped to stock; unknown/inactive books, bad keys and empty lines are
+    dropped. Returns a namespace with:
+
+    - lines: dicts (id, title, author, cover_url, category_id, price, stock, quantity, line_total), in cart order
+    - subtotal: sum of line totals
+    - quantities: the cleaned cart ({str(book_id): quantity}) to write back to the session
+    """
+    wanted: Dict[int, int] = {}
+    for bid_str, qty in cart.items():
+        try:
+            bid = int(bid_str)
+            q = int(qty) or 0
+        except (ValueError, TypeError):
+            continue
+        if q > 0:
+            wanted[bid] = q
+    rows = {}
+    if wanted:
+        ids = list(wanted)
+        rows = {
+            r["id"]: r
+            for r in db.execute(
+                f"""SELECT id, title, author, cover_url, category_id, COALESCE(price, 0) as price,
+                    COALESCE(stock, 0) as stock FROM books
+                    WHERE id IN ({','.join(['?'] * len(ids))}) AND (is_active IS NULL OR is_active=1)""",
+                ids,
+            ).fetchall()
+        }
+    lines: List[dict] = []
+    quantities: Dict[str, int] = {}
+    for bid, q in wanted.items():
+        row = rows.get(bid)
+        if row is None:
+            continue
+        price = float(row["price"] or 0)
+        stock = int(row["stock"] or 0)
+        q = min(q, stock) if stock >= 0 else q
+        if q <= 0:
+            continue
+        quantities[str(bid)] = q
+        lines.append({
+            "id": row["id"],
+            "title": row["title"],
+            "author": row["author"],
+            "cover_url": row["cover_url"],
+            "category_id": row["category_id"],
+            "price": price,
+            "stock": stock,
+            "quantity": q,
+            "line_total": price * q,
+        })
+    return SimpleNamespace(
+        lines=lines,
+        subtotal=sum(line["line_total"] for line in lines),
+        quantities=quantities,
+    )
+
+
+def reserve_stock(session, quantities: Dict[int, int]) -> bool:
+    """
+    Decrement stock for every line in one conditional UPDATE ... FROM.
+
+    Lines are passed as a VALUES table (column1 = book id, column2 =
+    quantity); a row is only updated when it has enough stock, and
+    RETURNING tells which ones were. The statement starts with UPDATE (not
+    WITH) so the sqlite3 driver opens the transaction before running it.
+    Returns False when any line could not be reserved; the caller must roll
+    back, which also undoes the lines that were decremented.
+    """
+    if not quantities:
+        return True
+    params = {}
+    values = []
+    for i, (book_id, qty) in enumerate(quantities.items()):
+        params[f"b{i}"] = int(book_id)
+        params[f"q{i}"] = int(qty)
+        values.append(f"(:b{i}, :q{i})")
+    result = session.execute(
+        text(
+            "UPDATE books SET stock = COALESCE(books.stock, 0) - req.column2 "
+            f"FROM (VALUES {', '.join(values)}) AS req "
+            "WHERE books.id = req.column1 AND COALESCE(books.stock, 0) >= req.column2 "
+            "RETURNING books.id"
+        ),
+        params,
+    )
+    return len(result.fetchall()) == len(quantities)
+
+
+def new_checkout_token() -> str:
+    """Idempotency key rendered into the cart page's checkout form."""
+    return secrets.token_urlsafe(16)
+
+
+def checkout_order_for(session, token: Optional[str], user_id: int) -> Optional[int]:
+    """Order id already created for this user's checkout token, if any."""
+    if not token:
+        return None
+    return session.execute(
+        text("SELECT order_id FROM checkout_requests WHERE token = :token AND user_id = :uid"),
+        {"token": token, "uid": int(user_id)},
+    ).scalar()
+
+
+def claim_checkout_token(session, token: Optional[str], user_id: int) -> bool:
+    """
+    Record the token as the first write of the checkout transaction.
+
+    Returns False if another request already committed it (a double
+    submit that lost the race); the caller rolls back and shows that
+    request's order instead. A failed checkout rolls the claim back too, so
+    the same token can be retried. Without a token nothing is recorded.
+    """
+    if not token:
+        return True
+    try:
+        session.execute(
+            text("INSERT INTO checkout_requests (token, user_id) VALUES (:token, :uid)"),
+            {"token": token, "uid": int(user_id)},
+        )
+    except IntegrityError:
+        return False
+    return True
+
+
+def complete_checkout_token(session, token: Optional[str], order_id: int) -> None:
+    if token:
+        session.execute(
+            text("UPDATE checkout_requests SET order_id = :oid WHERE token = :token"),
+            {"oid": int(order_id), "token": token},
+        )
@@ -0,0 +1,223 @@
+"""Server-side cart storage; the session cookie only carries a cart id."""
+import abc
+import time
+import secrets
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CARTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS carts (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_carts_user ON carts(user_id);
+CREATE INDEX IF NOT EXISTS idx_carts_updated ON carts(updated_at);
+CREATE TABLE IF NOT EXISTS cart_items (
+    cart_id TEXT NOT NULL REFERENCES carts(id) ON DELETE CASCADE,
+    book_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    PRIMARY KEY (cart_id, book_id)
+);
+"""
+
+
+def new_cart_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+class CartStore(abc.ABC):
+    """
+    Cart backend interface. Carts map str(book_id) -> quantity.
+
+    Database-backed stores write in the caller's transaction; the caller
+    commits. Item counts are cached per cart id (for the navbar badge),
+    dropped on every write through this store and reloaded after
+    ``count_max_age`` seconds, which bounds how stale another worker
+    process's badge can get.
+    """
+
+    def __init__(self, count_cache_size: int = 10000, count_max_age: float = 60.0):
+        self._counts: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._counts_size = count_cache_size
+        self._counts_max_age = count_max_age
+        self._counts_lock = threading.Lock()
+
+    # -- backend primitives
+    @abc.abstractmethod
+    def get(self, cart_id: str) -> Dict[str, int]:
+        ...
+
+    @abc.abstractmethod
+    def replace(self, cart_id: str, items: Dict[str, int]) -> None:
+        """Overwrite the cart contents (items with quantity <= 0 are dropped)."""
+
+    @abc.abstractmethod
+    def user_cart_id(self, user_id: int) -> Optional[str]:
+        ...
+
+    @abc.abstractmethod
+    def set_user(self, cart_id: str, user_id: int) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, cart_id: str) -> None:
+        ...
+
+    # -- operations built on them
+    def set_quantity(self, cart_id: str, book_id: int, quantity: int) -> None:
+        items = self.get(cart_id)
+        if quantity > 0:
+            items[str(book_id)] = int(quantity)
+        else:
+            items.pop(str(book_id), None)
+        self.replace(cart_id, items)
+
+    def clear(self, cart_id: str) -> None:
+        self.replace(cart_id, {})
+
+    def count(self, cart_id: Optional[str]) -> int:
+        if not cart_id:
+            return 0
+        now = time.monotonic()
+        with self._counts_lock:
+            entry = self._counts.get(cart_id)
+            if entry is not None and now - entry[0] < self._counts_max_age:
+                self._counts.move_to_end(cart_id)
+                return entry[1]
+        total = sum(self.get(cart_id).values())
+        with self._counts_lock:
+            self._counts[cart_id] = (now, total)
+            self._counts.move_to_end(cart_id)
+            while len(self._counts) > self._counts_size:
+                self._counts.popitem(last=False)
+        return total
+
+    def attach_user(self, cart_id: Optional[str], user_id: int) -> Optional[str]:
+        """
+        On login: merge the anonymous cart into the user's saved cart.
+
+        Quantities for the same book are added. Returns the cart id the
+        session should use from now on.
+        """
+        saved = self.user_cart_id(user_id)
+        if not cart_id or cart_id == saved:
+            return saved
+        if saved is None:
+            self.set_user(cart_id, user_id)
+            return cart_id
+        merged = self.get(saved)
+        for book_id, qty in self.get(cart_id).items():
+            merged[book_id] = merged.get(book_id, 0) + int(qty)
+        self.replace(saved, merged)
+        self.delete(cart_id)
+        return saved
+
+    def _forget_count(self, cart_id: str) -> None:
+        with self._counts_lock:
+            self._counts.pop(cart_id, None)
+
+
+class SQLiteCartStore(CartStore):
+    """Default backend: carts / cart_items tables in the app database (the caller commits)."""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], count_cache_size: int = 10000,
+                 count_max_age: float = 60.0):
+        super().__init__(count_cache_size, count_max_age)
+        self._connect = connect
+
+    def get(self, cart_id: str) -> Dict[str, int]:
+        rows = self._connect().execute(
+            "SELECT book_id, quantity FROM cart_items WHERE cart_id=?", (cart_id,)
+        ).fetchall()
+        return {str(r[0]): int(r[1]) for r in rows}
+
+    def replace(self, cart_id: str, items: Dict[str, int]) -> None:
+        db = self._connect()
+        db.execute(
+            """INSERT INTO carts (id) VALUES (?)
+               ON CONFLICT(id) DO UPDATE SET updated_at=CURRENT_TIMESTAMP""",
+            (cart_id,),
+        )
+        db.execute("DELETE FROM cart_items WHERE cart_id=?", (cart_id,))
+        db.executemany(
+            "INSERT INTO cart_items (cart_id, book_id, quantity) VALUES (?,?,?)",
+            [(cart_id, int(b), int(q)) for b, q in items.items() if int(q) > 0],
+        )
+        self._forget_count(cart_id)
+
+    def user_cart_id(self, user_id: int) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT id FROM carts WHERE user_id=? ORDER BY updated_at DESC LIMIT 1", (user_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_user(self, cart_id: str, user_id: int) -> None:
+        db = self._connect()
+        db.execute(
+            """INSERT INTO carts (id, user_id) VALUES (?, ?)
+               ON CONFLICT(id) DO UPDATE SET user_id=excluded.user_id, updated_at=CURRENT_TIMESTAMP""",
+            (cart_id, user_id),
+        )
+
+    def delete(self, cart_id: str) -> None:
+        db = self._connect()
+        db.execute("DELETE FROM cart_items WHERE cart_id=?", (cart_id,))
+        db.execute("DELETE FROM carts WHERE id=?", (cart_id,))
+        self._forget_count(cart_id)
+
+
+class MemoryCartStore(CartStore):
+    """In-process LRU backend (single process only; carts are lost on restart)."""
+
+    def __init__(self, max_carts: int = 10000, count_max_age: float = 60.0):
+        super().__init__(max_carts, count_max_age)
+        self.max_carts = max_carts
+        self._carts: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._owners: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, cart_id: str) -> Dict[str, int]:
+        with self._lock:
+            items = self._carts.get(cart_id)
+            if items is None:
+                return {}
+            self._carts.move_to_end(cart_id)
+            return dict(items)
+
+    def replace(self, cart_id: str, items: Dict[str, int]) -> None:
+        with self._lock:
+            self._carts[cart_id] = {str(b): int(q) for b, q in items.items() if int(q) > 0}
+            self._carts.move_to_end(cart_id)
+            while len(self._carts) > self.max_carts:
+                evicted, _ = self._carts.popitem(last=False)
+                self._owners = {u: c for u, c in self._owners.items() if c != evicted}
+        self._forget_count(cart_id)
+
+    def user_cart_id(self, user_id: int) -> Optional[str]:
+        with self._lock:
+            return self._owners.get(user_id)
+
+    def set_user(self, cart_id: str, user_id: int) -> None:
+        with self._lock:
+            self._owners[user_id] = cart_id
+            self._carts.setdefault(cart_id, {})
+
+    def delete(self, cart_id: str) -> None:
+        with self._lock:
+            self._carts.pop(cart_id, None)
+            self._owners = {u: c for u, c in self._owners.items() if c != cart_id}
+        self._forget_count(cart_id)
+
+
+def make_cart_store(backend: str, connect: Callable[[], sqlite3.Connection], count_max_age: float = 60.0) -> CartStore:
+    """CART_BACKEND: 'sqlite' (default) or 'memory'."""
+    if (backend or "sqlite").lower() == "memory":
+        return MemoryCartStore(count_max_age=count_max_age)
+    return SQLiteCartStore(connect, count_max_age=count_max_age)
@@ -0,0 +1,67 @@
+"""In-process category map (id <-> name) shared by listing routes."""
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryMap:
+    """
+    Categories loaded once per process and reused until invalidated.
+
+    Admin category routes call ``invalidate()``; ``max_age`` bounds how long
+    another worker process can serve a stale copy. ``version`` increases on
+    every reload so callers can key derived caches on it.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self.version = 0
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._by_id: Dict[int, dict] = {}
+        self._by_name: Dict[str, int] = {}
+        self._ordered: List[dict] = []
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure(self, db: sqlite3.Connection) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.max_age:
+            return
+        rows = db.execute("SELECT id, name, slug FROM categories ORDER BY name").fetchall()
+        ordered = [{"id": r[0], "name": r[1], "slug": r[2]} for r in rows]
+        with self._lock:
+            self._ordered = ordered
+            self._by_id = {c["id"]: c for c in ordered}
+            self._by_name = {c["name"]: c["id"] for c in ordered}
+            self._loaded_at = time.monotonic()
+            self.version += 1
+
+    def snapshot(self) -> Optional[List[dict]]:
+        """The loaded list if still fresh, else None (no database access)."""
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.max_age:
+            return None
+        return self._ordered
+
+    def all(self, db: sqlite3.Connection) -> List[dict]:
+        """Categories ordered by name (shared list; do not mutate)."""
+        self._ensure(db)
+        return self._ordered
+
+    def name_of(self, db: sqlite3.Connection, category_id: Optional[int]) -> Optional[str]:
+        if category_id is None:
+            return None
+        self._ensure(db)
+        cat = self._by_id.get(category_id)
+        return cat["name"] if cat else None
+
+    def id_of(self, db: sqlite3.Connection, name: str) -> Optional[int]:
+        self._ensure(db)
+        return self._by_name.get(name)
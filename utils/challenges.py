@@ -0,0 +1,128 @@
+"""Reading-challenge progress from book views, applied off the request path."""
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Set
+
+
+from .db import SQLiteOnlyError, raw_connection
+from .feed import DEFAULT_FANOUT_LIMIT, record_activity
+from .workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+
+class ChallengeProgressWorker(BackgroundWorker):
+    """
+    Applies queued book-view events in batches.
+
+    ``record_view`` only enqueues, so book_detail never writes. Each batch is
+    coalesced per user: new book_views rows are inserted, the user's active
+    challenges are advanced once by the number of new views, and completions
+    are recorded. Completion titles wait in ``pop_notices`` until the user's
+    next request. Events and notices live in this process only.
+    """
+
+    name = "challenge-progress"
+
+    def __init__(self, app, interval: float = 5.0, batch_size: int = 500, fanout_limit: int = DEFAULT_FANOUT_LIMIT):
+        super().__init__(app, interval)
+        self.batch_size = batch_size
+        self.fanout_limit = fanout_limit
+        self._events: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._notices: Dict[int, List[str]] = {}
+        self._notices_lock = threading.Lock()
+
+    def record_view(self, user_id: int, book_id: int) -> None:
+        self._events.put((int(user_id), int(book_id)))
+        if not self.is_running():
+            # worker disabled (tests, CLI): apply inline to keep behaviour
+            try:
+                self.run_once()
+            except SQLiteOnlyError:
+                # non-SQLite DATABASE_URL: challenge progress is off (logged at startup)
+                pass
+
+    def pop_notices(self, user_id: int) -> List[str]:
+        with self._notices_lock:
+            return self._notices.pop(int(user_id), [])
+
+    def _drain(self) -> Dict[int, Set[int]]:
+        by_user: Dict[int, Set[int]] = {}
+        for _ in range(self.batch_size):
+            try:
+                user_id, book_id = self._events.get_nowait()
+            except queue.Empty:
+                break
+            by_user.setdefault(user_id, set()).add(book_id)
+        return by_user
+
+    def run_once(self) -> int:
+        by_user = self._drain()
+        if not by_user:
+            return 0
+        db = raw_connection()
+        applied = 0
+        try:
+            for user_id, book_ids in by_user.items():
+                db.execute("SAVEPOINT user_views")
+                try:
+                    titles = self._apply_user(db, user_id, book_ids)
+                    db.execute("RELEASE user_views")
+                except sqlite3.Error:
+                    db.execute("ROLLBACK TO user_views")
+                    db.execute("RELEASE user_views")
+                    logger.exception("%s: failed to apply views for user %s", self.name, user_id)
+                    continue
+                applied += 1
+                if titles:
+                    with self._notices_lock:
+                        self._notices.setdefault(user_id, []).extend(titles)
+            db.commit()
+        finally:
+            db.close()
+        if not self._events.empty():
+            self.wake()
+        return applied
+
+    def _apply_user(self, db: sqlite3.Connection, user_id: int, book_ids: Set[int]) -> List[str]:
+        new_views = 0
+        for book_id in sorted(book_ids):
+            cur = db.execute("INSERT OR IGNORE INTO book_views (user_id, book_id) VALUES (?,?)", (user_id, book_id))
+            new_views += cur.rowcount
+        if not new_views:
+            return []
+        db.execute(
+            """
+            UPDATE user_challenges
+            SET current_count = current_count + ?
+            WHERE user_id = ? AND challenge_id IN (
+                SELECT id FROM reading_challenges WHERE is_active = 1
+            )
+            """,
+            (new_views, user_id),
+        )
+        completed = db.execute(
+            """
+            SELECT uc.challenge_id, rc.title
+            FROM user_challenges uc
+            JOIN reading_challenges rc ON rc.id = uc.challenge_id
+            WHERE uc.user_id = ? AND uc.current_count >= rc.target_count AND uc.completed_at IS NULL
+            """,
+            (user_id,),
+        ).fetchall()
+        for challenge_id, title in completed:
+            db.execute(
+                "UPDATE user_challenges SET completed_at = CURRENT_TIMESTAMP WHERE user_id = ? AND challenge_id = ?",
+                (user_id, challenge_id),
+            )
+            try:
+                record_activity(
+                    db, user_id, "challenge_complete", challenge_id, "challenge",
+                    f"completed challenge: {title}", fanout_limit=self.fanout_limit,
+                )
+            except sqlite3.IntegrityError:
+                # older databases lack 'challenge_complete' in the activity_type CHECK
+                logger.warning("could not record challenge_complete activity for user %s", user_id)
+        return [title for _, title in completed]
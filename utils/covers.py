@@ -0,0 +1,125 @@
+"""Background ingestion of external book covers into static/uploads."""
+import sqlite3
+import logging
+from typing import List
+
+from flask import current_app
+
+from .cache import BOOK_SECTIONS, invalidate_sections
+from .images import download_cover_if_external, is_external_url
+from .db import raw_connection
+from .workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+# Give up on a URL after this many failed downloads
+MAX_ATTEMPTS = 5
+# Retry delay (minutes) doubles with each failed attempt, capped below
+BASE_RETRY_MINUTES = 5
+MAX_RETRY_MINUTES = 24 * 60
+
+
+def mark_cover_skipped(db: sqlite3.Connection, url: str) -> None:
+    """Tell the ingest worker to leave this external URL alone (admin chose to keep it)."""
+    if not is_external_url(url):
+        return
+    db.execute(
+        """INSERT INTO cover_ingest (url, status, updated_at) VALUES (?, 'skipped', CURRENT_TIMESTAMP)
+           ON CONFLICT(url) DO UPDATE SET status='skipped', updated_at=CURRENT_TIMESTAMP""",
+        (url.strip(),),
+    )
+
+
+def pending_cover_urls(db: sqlite3.Connection, limit: int) -> List[str]:
+    """External cover URLs that were never tried, or whose retry time has come."""
+    rows = db.execute(
+        """
+        SELECT DISTINCT b.cover_url
+        FROM books b
+        LEFT JOIN cover_ingest ci ON ci.url = b.cover_url
+        WHERE (b.cover_url LIKE 'http://%' OR b.cover_url LIKE 'https://%')
+          AND (ci.url IS NULL
+               OR (ci.status = 'failed' AND ci.attempts < ?
+                   AND (ci.next_attempt_at IS NULL OR ci.next_attempt_at <= CURRENT_TIMESTAMP)))
+        LIMIT ?
+        """,
+        (MAX_ATTEMPTS, limit),
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def reuse_ingested_covers(db: sqlite3.Connection) -> int:
+    """Point books at the stored copy of a URL that was already downloaded. The caller commits."""
+    cur = db.execute(
+        """
+        UPDATE books SET cover_url = (
+            SELECT ci.local_path FROM cover_ingest ci WHERE ci.url = books.cover_url
+        )
+        WHERE cover_url IN (
+            SELECT url FROM cover_ingest WHERE status = 'done' AND local_path IS NOT NULL
+        )
+        """
+    )
+    return cur.rowcount
+
+
+def ingest_cover(db: sqlite3.Connection, url: str) -> bool:
+    """Download one URL, rewrite every book row using it and record the outcome."""
+    local = download_cover_if_external(url)
+    if local and local != url:
+        db.execute("UPDATE books SET cover_url=? WHERE cover_url=?", (local, url))
+        db.execute(
+            """INSERT INTO cover_ingest (url, status, local_path, attempts, updated_at)
+               VALUES (?, 'done', ?, 1, CURRENT_TIMESTAMP)
+               ON CONFLICT(url) DO UPDATE SET status='done', local_path=excluded.local_path,
+                   attempts=cover_ingest.attempts + 1, last_error=NULL, next_attempt_at=NULL,
+                   updated_at=CURRENT_TIMESTAMP""",
+            (url, local),
+        )
+        db.commit()
+        return True
+    row = db.execute("SELECT attempts FROM cover_ingest WHERE url=?", (url,)).fetchone()
+    attempts = (row[0] if row else 0) + 1
+    delay = min(BASE_RETRY_MINUTES * (2 ** (attempts - 1)), MAX_RETRY_MINUTES)
+    db.execute(
+        """INSERT INTO cover_ingest (url, status, attempts, last_error, next_attempt_at, updated_at)
+           VALUES (?, 'failed', ?, ?, datetime('now', ?), CURRENT_TIMESTAMP)
+           ON CONFLICT(url) DO UPDATE SET status='failed', attempts=excluded.attempts,
+               last_error=excluded.last_error, next_attempt_at=excluded.next_attempt_at,
+               updated_at=CURRENT_TIMESTAMP""",
+        (url, attempts, "download failed", f"+{delay} minutes"),
+    )
+    db.commit()
+    return False
+
+
+class CoverIngestWorker(BackgroundWorker):
+    """Watches books.cover_url for external URLs and downloads each one once."""
+
+    name = "cover-ingest"
+
+    def __init__(self, app, interval: float = 60.0, batch_size: int = 10):
+        super().__init__(app, interval)
+        self.batch_size = batch_size
+
+    def run_once(self) -> int:
+        db = raw_connection()
+        try:
+            # new books may reuse a URL stored earlier; that one is never pending again
+            reused = reuse_ingested_covers(db)
+            db.commit()
+            urls = pending_cover_urls(db, self.batch_size)
+            done = 0
+            for url in urls:
+                if ingest_cover(db, url):
+                    done += 1
+            if len(urls) == self.batch_size:
+                # more work is probably waiting; go again without sleeping
+                self.wake()
+            if done or reused:
+                invalidate_sections(getattr(current_app, "cache", None), BOOK_SECTIONS)
+            if urls:
+                logger.info("cover-ingest: %d/%d covers stored locally", done, len(urls))
+            return done + reused
+        finally:
+            db.close()
@@ -1,24 +1,220 @@
-"""Database utility functions."""
+"""Database utility functions: one pooled SQLAlchemy engine for ORM and raw SQL."""
+import re
 import sqlite3
-from flask import g, current_app
-from typing import Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
+from flask import g
+from sqlalchemy import event
 
-def get_db() -> sqlite3.Connection:
-    """Get database connection from Flask g object."""
+from extensions import db as orm
+
+# Applied to every new SQLite connection in the pool (SQLITE_PRAGMAS overrides)
+DEFAULT_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,  # KiB, i.e. ~20 MB page cache per connection
+    "mmap_size": 268435456,
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+}
+
+
+class SQLiteOnlyError(RuntimeError):
+    """A raw-SQL path that only works on SQLite was used with another engine (DATABASE_URL)."""
+
+
+# SQLite-only SQL the facade refuses on other engines, instead of a driver error
+_SQLITE_ONLY_SQL = re.compile(
+    r"\bINSERT\s+OR\s+(?:IGNORE|REPLACE)\b|\b(?:datetime|julianday|strftime)\s*\(|\bdate\s*\(\s*'now'"
+    r"|\bPRAGMA\b|\bCOLLATE\s+NOCASE\b|\bWITHOUT\s+ROWID\b|\bbooks_fts\b",
+    re.IGNORECASE,
+)
+_QMARK = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|\?""")
+
+
+def is_sqlite() -> bool:
+    return orm.engine.dialect.name == "sqlite"
+
+
+def require_sqlite(feature: str) -> None:
+    """Raise SQLiteOnlyError naming ``feature`` unless the engine is SQLite."""
+    if not is_sqlite():
+        raise SQLiteOnlyError(f"{feature} needs SQLite; DATABASE_URL points at {orm.engine.dialect.name}")
+
+
+def install_engine_hooks(app) -> None:
+    """Run the configured PRAGMAs on each new pooled SQLite connection."""
+    with app.app_context():
+        engine = orm.engine
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = {**DEFAULT_SQLITE_PRAGMAS, **(app.config.get("SQLITE_PRAGMAS") or {})}
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                if value is not None:
+                    cur.execute(f"PRAGMA {name}={value}")
+        finally:
+            cur.close()
+
+
+class NamedRow(tuple):
+    """Tuple row that is also addressable by column name, like sqlite3.Row."""
+
+    def __new__(cls, values, index: Dict[str, int]):
+        row = super().__new__(cls, values)
+        row._index = index
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def keys(self) -> List[str]:
+        return list(self._index)
+
+
+class NamedCursor:
+    """
+    DBAPI cursor wrapper for non-SQLite drivers (psycopg returns plain tuples).
+
+    Translates qmark placeholders to the driver's ``%s``, refuses the
+    SQLite-only SQL in ``_SQLITE_ONLY_SQL`` with SQLiteOnlyError, and
+    returns NamedRow rows so routes can keep using ``row["column"]``.
+    """
+
+    def __init__(self, cursor, dialect: str, paramstyle: str):
+        self._cursor = cursor
+        self._dialect = dialect
+        self._paramstyle = paramstyle
+        self._index: Dict[str, int] = {}
+
+    def _sql(self, sql: str) -> str:
+        match = _SQLITE_ONLY_SQL.search(sql)
+        if match:
+            raise SQLiteOnlyError(f"SQLite-only SQL ({match.group(0)!r}) is not supported on {self._dialect}: {sql.strip()[:120]}")
+        if self._paramstyle not in ("format", "pyformat"):
+            return sql
+        # these drivers treat every % as a marker, including inside literals
+        return _QMARK.sub(lambda m: m.group(1) or "%s", sql.replace("%", "%%"))
+
+    def _described(self) -> "NamedCursor":
+        description = self._cursor.description or ()
+        self._index = {d[0]: i for i, d in enumerate(description)}
+        return self
+
+    def execute(self, sql: str, params: Any = ()) -> "NamedCursor":
+        self._cursor.execute(self._sql(sql), tuple(params))
+        return self._described()
+
+    def executemany(self, sql: str, seq_of_params: Iterable) -> "NamedCursor":
+        self._cursor.executemany(self._sql(sql), [tuple(p) for p in seq_of_params])
+        return self._described()
+
+    def _row(self, values) -> Optional[NamedRow]:
+        return None if values is None else NamedRow(values, self._index)
+
+    def fetchone(self) -> Optional[NamedRow]:
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size: Optional[int] = None) -> List[NamedRow]:
+        rows = self._cursor.fetchmany() if size is None else self._cursor.fetchmany(size)
+        return [self._row(r) for r in rows]
+
+    def fetchall(self) -> List[NamedRow]:
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def __iter__(self) -> Iterator[NamedRow]:
+        return iter(self.fetchone, None)
+
+    @property
+    def lastrowid(self):
+        raise SQLiteOnlyError(f"cursor.lastrowid is not supported on {self._dialect}; use INSERT ... RETURNING id")
+
+    def __getattr__(self, name):
+        # rowcount, description, close, ...
+        return getattr(self._cursor, name)
+
+
+class SessionConnection:
+    """
+    sqlite3.Connection-style facade over the ORM session's connection.
+
+    Raw-SQL routes keep calling execute/executemany/commit, but on the same
+    pooled DBAPI connection and transaction as ``db.session``; commit and
+    rollback go through the session so ORM changes are included. Rows are
+    sqlite3.Row on SQLite; on other engines (DATABASE_URL) cursors are
+    NamedCursor, and SQLite-only SQL raises SQLiteOnlyError.
+    """
+
+    def _driver(self):
+        return orm.session.connection().connection.driver_connection
+
+    def cursor(self):
+        cur = self._driver().cursor()
+        if isinstance(cur, sqlite3.Cursor):
+            cur.row_factory = sqlite3.Row
+            return cur
+        return NamedCursor(cur, orm.engine.dialect.name, orm.engine.dialect.paramstyle)
+
+    def execute(self, sql: str, params: Any = ()):
+        cur = self.cursor()
+        cur.execute(sql, params)
+        return cur
+
+    def executemany(self, sql: str, seq_of_params: Iterable):
+        cur = self.cursor()
+        cur.executemany(sql, seq_of_params)
+        return cur
+
+    def executescript(self, script: str):
+        require_sqlite("executescript")
+        return self._driver().executescript(script)
+
+    def commit(self) -> None:
+        orm.session.commit()
+
+    def rollback(self) -> None:
+        orm.session.rollback()
+
+    def close(self) -> None:
+        """The session (and its pooled connection) is released at app-context teardown."""
+
+    @property
+    def in_transaction(self) -> bool:
+        return orm.session.in_transaction()
+
+    @property
+    def total_changes(self) -> int:
+        require_sqlite("total_changes")
+        return self._driver().total_changes
+
+
+def get_db() -> SessionConnection:
+    """Raw-SQL handle for the current app context, sharing db.session's connection."""
     if "db" not in g:
-        g.db = sqlite3.connect(current_app.config["DATABASE"])
-        g.db.row_factory = sqlite3.Row
-        # Enable foreign keys
-        g.db.execute("PRAGMA foreign_keys = ON")
+        g.db = SessionConnection()
     return g.db
 
 
+def raw_connection():
+    """
+    A pooled DBAPI connection for background threads and streamed responses.
+
+    ``close()`` returns it to the pool (rolling back anything uncommitted).
+    Its callers run SQLite SQL directly, so other engines raise SQLiteOnlyError.
+    """
+    require_sqlite("raw_connection")
+    return orm.engine.raw_connection()
+
+
 def close_db(error=None):
-    """Close database connection."""
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
+    """Drop the per-context handle; Flask-SQLAlchemy removes the session itself."""
+    g.pop("db", None)
 
 
 def init_db(app):
@@ -37,4 +233,3 @@ def init_db(app):
             app.logger.error(f"Error initializing database: {e}")
         finally:
             db.close()
-
@@ -0,0 +1,198 @@
+"""Activity feed: per-user inboxes filled on write, with pull for high-follower accounts."""
+import sqlite3
+import logging
+from typing import Dict, List, Optional
+
+from .hydrate import EntityHydrator
+
+logger = logging.getLogger(__name__)
+
+# Followers above which an author's activities are no longer copied into
+# every follower's inbox; readers pull them from user_activities instead
+DEFAULT_FANOUT_LIMIT = 1000
+
+# feed_inbox holds one row per (reader, activity), created_at copied from the
+# activity so the feed is a range read on (user_id, created_at); feed_pull_authors
+# lists the accounts whose activities are merged in at read time
+FEED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feed_inbox (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    activity_id INTEGER NOT NULL REFERENCES user_activities(id) ON DELETE CASCADE,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, activity_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_feed_inbox_user_created ON feed_inbox(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_feed_inbox_activity ON feed_inbox(activity_id);
+CREATE TABLE IF NOT EXISTS feed_pull_authors (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_user_activities_user_created ON user_activities(user_id, created_at);
+"""
+
+
+def _is_pull_author(db: sqlite3.Connection, user_id: int, fanout_limit: int) -> bool:
+    """True once ``user_id`` has more than ``fanout_limit`` followers (sticky)."""
+    if db.execute("SELECT 1 FROM feed_pull_authors WHERE user_id=?", (user_id,)).fetchone():
+        return True
+    followers = db.execute(
+        "SELECT COUNT(1) FROM (SELECT 1 FROM user_follows WHERE following_id=? LIMIT ?)",
+        (user_id, fanout_limit + 1),
+    ).fetchone()[0]
+    if followers <= fanout_limit:
+        return False
+    db.execute("INSERT OR IGNORE INTO feed_pull_authors (user_id) VALUES (?)", (user_id,))
+    return True
+
+
+def record_activity(
+    db: sqlite3.Connection,
+    user_id: int,
+    activity_type: str,
+    target_id: Optional[int],
+    target_type: Optional[str],
+    metadata: Optional[str] = None,
+    fanout_limit: int = DEFAULT_FANOUT_LIMIT,
+) -> int:
+    """
+    Insert a user_activities row and deliver it to the feed inboxes.
+
+    The author always gets it; followers get a copy unless the author is a
+    pull author (see ``_is_pull_author``). Runs in the caller's transaction,
+    the caller commits. Returns the activity id.
+    """
+    user_id = int(user_id)
+    cur = db.execute(
+        "INSERT INTO user_activities (user_id, activity_type, target_id, target_type, metadata) VALUES (?,?,?,?,?)",
+        (user_id, activity_type, target_id, target_type, metadata),
+    )
+    activity_id = cur.lastrowid
+    db.execute(
+        "INSERT INTO feed_inbox (user_id, activity_id, created_at) SELECT user_id, id, created_at FROM user_activities WHERE id=?",
+        (activity_id,),
+    )
+    if not _is_pull_author(db, user_id, fanout_limit):
+        db.execute(
+            """
+            INSERT OR IGNORE INTO feed_inbox (user_id, activity_id, created_at)
+            SELECT uf.follower_id, ua.id, ua.created_at
+            FROM user_activities ua JOIN user_follows uf ON uf.following_id = ua.user_id
+            WHERE ua.id = ?
+            """,
+            (activity_id,),
+        )
+    return activity_id
+
+
+def follow_inbox(db: sqlite3.Connection, follower_id: int, following_id: int, limit: int = 50) -> None:
+    """Copy the followee's latest activities into a new follower's inbox."""
+    db.execute(
+        """
+        INSERT OR IGNORE INTO feed_inbox (user_id, activity_id, created_at)
+        SELECT ?, id, created_at FROM user_activities
+        WHERE user_id = ? AND NOT EXISTS (SELECT 1 FROM feed_pull_authors WHERE user_id = ?)
+        ORDER BY created_at DESC LIMIT ?
+        """,
+        (int(follower_id), int(following_id), int(following_id), int(limit)),
+    )
+
+
+def unfollow_inbox(db: sqlite3.Connection, follower_id: int, following_id: int) -> None:
+    db.execute(
+        """
+        DELETE FROM feed_inbox
+        WHERE user_id = ? AND activity_id IN (SELECT id FROM user_activities WHERE user_id = ?)
+        """,
+        (int(follower_id), int(following_id)),
+    )
+
+
+def backfill_inboxes(db: sqlite3.Connection, fanout_limit: int = DEFAULT_FANOUT_LIMIT) -> int:
+    """
+    Fill feed_inbox from existing activities and follows (initial migration).
+
+    Authors over ``fanout_limit`` followers are marked as pull authors and
+    not copied. The caller commits. Returns the number of inbox rows added.
+    """
+    db.execute(
+        """
+        INSERT OR IGNORE INTO feed_pull_authors (user_id)
+        SELECT following_id FROM user_follows GROUP BY following_id HAVING COUNT(1) > ?
+        """,
+        (int(fanout_limit),),
+    )
+    added = db.execute(
+        "INSERT OR IGNORE INTO feed_inbox (user_id, activity_id, created_at) SELECT user_id, id, created_at FROM user_activities"
+    ).rowcount
+    added += db.execute(
+        """
+        INSERT OR IGNORE INTO feed_inbox (user_id, activity_id, created_at)
+        SELECT uf.follower_id, ua.id, ua.created_at
+        FROM user_activities ua JOIN user_follows uf ON uf.following_id = ua.user_id
+        WHERE ua.user_id NOT IN (SELECT user_id FROM feed_pull_authors)
+        """
+    ).rowcount
+    return added
+
+
+def load_feed(db: sqlite3.Connection, user_id: int, limit: int = 50, hydrator: Optional[EntityHydrator] = None) -> List[Dict]:
+    """
+    Newest ``limit`` activities for a reader, hydrated for activity_feed.html.
+
+    One statement reads the inbox range and merges in followed pull authors;
+    the activity rows are then fetched by id, and their targets resolved by
+    ``hydrator`` with one query per target type (book cards may come from
+    its cache).
+    """
+    uid, limit = int(user_id), int(limit)
+    hydrator = hydrator or EntityHydrator(book_cache_size=0)
+    ids = [
+        r[0]
+        for r in db.execute(
+            """
+            SELECT activity_id FROM (
+                SELECT activity_id, created_at FROM (
+                    SELECT activity_id, created_at FROM feed_inbox
+                    WHERE user_id = ? ORDER BY created_at DESC, activity_id DESC LIMIT ?
+                )
+                UNION
+                SELECT activity_id, created_at FROM (
+                    SELECT ua.id AS activity_id, ua.created_at
+                    FROM feed_pull_authors pa
+                    JOIN user_follows uf ON uf.following_id = pa.user_id AND uf.follower_id = ?
+                    JOIN user_activities ua ON ua.user_id = pa.user_id
+                    ORDER BY ua.created_at DESC, ua.id DESC LIMIT ?
+                )
+            )
+            ORDER BY created_at DESC, activity_id DESC LIMIT ?
+            """,
+            (uid, limit, uid, limit, limit),
+        )
+    ]
+    if not ids:
+        return []
+    marks = ",".join(["?"] * len(ids))
+    rows = db.execute(
+        f"""
+        SELECT ua.*, u.username
+        FROM user_activities ua JOIN users u ON u.id = ua.user_id
+        WHERE ua.id IN ({marks})
+        """,
+        ids,
+    ).fetchall()
+    by_id = {r["id"]: dict(r) for r in rows}
+    targets = hydrator.resolve(db, ((a["target_type"], a["target_id"]) for a in by_id.values()))
+    activities = []
+    for activity_id in ids:
+        activity = by_id.get(activity_id)
+        if activity is None:
+            continue
+        target = targets.get(activity["target_type"], {}).get(activity["target_id"])
+        activity["target"] = target
+        if target and activity["target_type"] == "book":
+            activity["book_title"] = target["title"]
+            activity["book_cover"] = target["cover_url"]
+        elif target and activity["target_type"] == "challenge":
+            activity["challenge_title"] = target["title"]
+        activities.append(activity)
+    return activities
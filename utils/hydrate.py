@@ -0,0 +1,91 @@
+"""Batched lookup of referenced entities (books, challenges, users) by id."""
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# target_type -> columns fetched for it (the first one is the id)
+ENTITY_QUERIES = {
+    "book": "SELECT id, title, author, cover_url FROM books WHERE id IN ({marks})",
+    "challenge": "SELECT id, title FROM reading_challenges WHERE id IN ({marks})",
+    "user": "SELECT id, username FROM users WHERE id IN ({marks})",
+}
+
+
+class EntityHydrator:
+    """
+    Resolves ids to small dicts with one ``IN`` query per entity type.
+
+    Book cards (id, title, author, cover_url) are also kept in a
+    process-wide LRU of ``book_cache_size`` entries, so feeds and shelves
+    showing the same popular books mostly skip the query. Admin book routes
+    call ``invalidate_books``; ``max_age`` bounds how long another worker
+    process (or the cover worker's URL rewrite) can leave a card stale.
+    """
+
+    def __init__(self, book_cache_size: int = 2048, max_age: float = 300.0):
+        self.book_cache_size = book_cache_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._books: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+
+    def invalidate_books(self, book_ids: Optional[Iterable[int]] = None) -> None:
+        with self._lock:
+            if book_ids is None:
+                self._books.clear()
+                return
+            for book_id in book_ids:
+                self._books.pop(int(book_id), None)
+
+    @staticmethod
+    def _fetch(db: sqlite3.Connection, entity_type: str, ids: List[int]) -> Dict[int, dict]:
+        sql = ENTITY_QUERIES[entity_type]
+        cur = db.execute(sql.format(marks=",".join(["?"] * len(ids))), ids)
+        names = [d[0] for d in cur.description]
+        return {row[0]: dict(zip(names, row)) for row in cur.fetchall()}
+
+    def books(self, db: sqlite3.Connection, book_ids: Iterable[int]) -> Dict[int, dict]:
+        """Book cards by id (shared dicts; do not mutate). Missing books are left out."""
+        ids = {int(i) for i in book_ids if i is not None}
+        found: Dict[int, dict] = {}
+        now = time.monotonic()
+        with self._lock:
+            for book_id in ids:
+                entry = self._books.get(book_id)
+                if entry is not None and now - entry[0] < self.max_age:
+                    self._books.move_to_end(book_id)
+                    found[book_id] = entry[1]
+        missing = sorted(ids - found.keys())
+        if missing:
+            loaded = self._fetch(db, "book", missing)
+            with self._lock:
+                for book_id, card in loaded.items():
+                    self._books[book_id] = (now, card)
+                    self._books.move_to_end(book_id)
+                while len(self._books) > self.book_cache_size:
+                    self._books.popitem(last=False)
+            found.update(loaded)
+        return found
+
+    def resolve(self, db: sqlite3.Connection, refs: Iterable[Tuple[Optional[str], Optional[int]]]) -> Dict[str, Dict[int, dict]]:
+        """
+        Look up (target_type, target_id) pairs, one query per known type.
+
+        Returns {target_type: {id: entity}}; unknown types and missing rows
+        are left out.
+        """
+        by_type: Dict[str, set] = {}
+        for entity_type, entity_id in refs:
+            if entity_type in ENTITY_QUERIES and entity_id is not None:
+                by_type.setdefault(entity_type, set()).add(int(entity_id))
+        resolved: Dict[str, Dict[int, dict]] = {}
+        for entity_type, ids in by_type.items():
+            if entity_type == "book":
+                resolved[entity_type] = self.books(db, ids)
+            else:
+                resolved[entity_type] = self._fetch(db, entity_type, sorted(ids))
+        return resolved
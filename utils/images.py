@@ -1,11 +1,14 @@
 """Image handling utilities."""
 import os
+import glob
 import time
+import threading
 import requests
+from collections import OrderedDict
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from flask import current_app
-from typing import Optional
+from typing import Optional, Tuple
 from urllib.parse import urlparse
 
 
@@ -20,6 +23,14 @@ def ensure_directories():
         os.makedirs(avatar_dir, exist_ok=True)
 
 
+def is_external_url(url: Optional[str]) -> bool:
+    """Return True if url points to a remote http(s) resource."""
+    if not url:
+        return False
+    url = url.strip()
+    return url.startswith('http://') or url.startswith('https://')
+
+
 def download_cover_if_external(url: str) -> str:
     """
     Download external image URL to local storage.
@@ -36,7 +47,7 @@ def download_cover_if_external(url: str) -> str:
     url = url.strip()
     
     # If already local path, return as is
-    if not (url.startswith('http://') or url.startswith('https://')):
+    if not is_external_url(url):
         return url
     
     ensure_directories()
@@ -104,3 +115,46 @@ def remove_existing_avatars(user_id: int):
         except Exception:
             pass
 
+
+class AvatarIndex:
+    """
+    User id -> avatar filename (None = no avatar), so pages skip the glob.
+
+    A bounded LRU of ``size`` users. The avatar routes call ``set`` /
+    ``invalidate``; ``max_age`` bounds how long another worker process can
+    keep serving a replaced or deleted avatar.
+    """
+
+    def __init__(self, avatar_dir: str, size: int = 4096, max_age: float = 300.0):
+        self.avatar_dir = avatar_dir
+        self.size = size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._files: "OrderedDict[int, Tuple[float, Optional[str]]]" = OrderedDict()
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._files.clear()
+            else:
+                self._files.pop(int(user_id), None)
+
+    def set(self, user_id: int, filename: Optional[str]) -> None:
+        with self._lock:
+            self._files[int(user_id)] = (time.monotonic(), filename)
+            self._files.move_to_end(int(user_id))
+            while len(self._files) > self.size:
+                self._files.popitem(last=False)
+
+    def filename(self, user_id: int) -> Optional[str]:
+        user_id = int(user_id)
+        with self._lock:
+            entry = self._files.get(user_id)
+            if entry is not None and time.monotonic() - entry[0] < self.max_age:
+                self._files.move_to_end(user_id)
+                return entry[1]
+        # look for files like 42.png, 42.jpg etc
+        matches = glob.glob(os.path.join(self.avatar_dir, f"{user_id}.*"))
+        name = os.path.basename(matches[0]) if matches else None
+        self.set(user_id, name)
+        return name
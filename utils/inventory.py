@@ -0,0 +1,167 @@
+"""Inventory ledger (append-only stock movements) and the low-stock projection."""
+import sqlite3
+import logging
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import text
+
+from .db import SQLiteOnlyError, raw_connection
+from .workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+# reason: 'checkout' (ref_id = order id), 'admin' (book form) or 'adjust'
+# (reconciliation with books.stock, including the initial backfill)
+INVENTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory_movements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    delta INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    ref_id INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_movements_book ON inventory_movements(book_id, created_at);
+CREATE TABLE IF NOT EXISTS low_stock (
+    book_id INTEGER PRIMARY KEY REFERENCES books(id) ON DELETE CASCADE,
+    stock INTEGER NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+_INSERT_MOVEMENT = (
+    "INSERT INTO inventory_movements (book_id, delta, reason, ref_id) VALUES (:book_id, :delta, :reason, :ref_id)"
+)
+
+
+def record_order_movements(session, order_id: int, quantities: Dict[int, int]) -> None:
+    """Append one 'checkout' movement per order line, in the checkout transaction."""
+    if not quantities:
+        return
+    session.execute(
+        text(_INSERT_MOVEMENT),
+        [
+            {"book_id": int(book_id), "delta": -int(qty), "reason": "checkout", "ref_id": int(order_id)}
+            for book_id, qty in quantities.items()
+        ],
+    )
+
+
+def record_movement(db: sqlite3.Connection, book_id: int, delta: int, reason: str = "admin") -> None:
+    if delta:
+        db.execute(_INSERT_MOVEMENT, {"book_id": int(book_id), "delta": int(delta), "reason": reason, "ref_id": None})
+
+
+def record_stock_set(db: sqlite3.Connection, book_id: int, new_stock: int, reason: str = "admin") -> None:
+    """Log the difference to ``new_stock``; call before updating books.stock."""
+    db.execute(
+        """
+        INSERT INTO inventory_movements (book_id, delta, reason)
+        SELECT id, :stock - COALESCE(stock, 0), :reason FROM books
+        WHERE id = :book_id AND COALESCE(stock, 0) != :stock
+        """,
+        {"book_id": int(book_id), "stock": int(new_stock), "reason": reason},
+    )
+
+
+def reconcile_ledger(db: sqlite3.Connection) -> int:
+    """
+    Append 'adjust' movements wherever the ledger sum differs from books.stock.
+
+    On an empty ledger this is the initial backfill; afterwards it absorbs
+    stock written outside the app (seed scripts, manual SQL). The caller
+    commits. Returns the number of books adjusted.
+    """
+    cur = db.execute(
+        """
+        INSERT INTO inventory_movements (book_id, delta, reason)
+        SELECT b.id, COALESCE(b.stock, 0) - COALESCE(m.total, 0), 'adjust'
+        FROM books b LEFT JOIN (
+            SELECT book_id, SUM(delta) as total FROM inventory_movements GROUP BY book_id
+        ) m ON m.book_id = b.id
+        WHERE COALESCE(b.stock, 0) != COALESCE(m.total, 0)
+        """
+    )
+    return cur.rowcount
+
+
+def stock_at(db: sqlite3.Connection, book_id: int, at: str) -> int:
+    """Replay the ledger: stock of a book as of ``at`` ('YYYY-MM-DD HH:MM:SS', UTC)."""
+    row = db.execute(
+        "SELECT COALESCE(SUM(delta), 0) FROM inventory_movements WHERE book_id = ? AND created_at <= ?",
+        (int(book_id), at),
+    ).fetchone()
+    return int(row[0])
+
+
+def refresh_low_stock(db: sqlite3.Connection, threshold: int, book_ids: Optional[Iterable[int]] = None) -> None:
+    """Rebuild low_stock rows (active books with stock <= threshold). The caller commits."""
+    sql = """
+        INSERT INTO low_stock (book_id, stock)
+        SELECT id, COALESCE(stock, 0) FROM books
+        WHERE COALESCE(stock, 0) <= ? AND (is_active IS NULL OR is_active = 1)
+    """
+    if book_ids is None:
+        db.execute("DELETE FROM low_stock")
+        db.execute(sql, (int(threshold),))
+        return
+    ids = sorted({int(i) for i in book_ids})
+    if not ids:
+        return
+    marks = ",".join(["?"] * len(ids))
+    db.execute(f"DELETE FROM low_stock WHERE book_id IN ({marks})", ids)
+    db.execute(sql + f" AND id IN ({marks})", [int(threshold)] + ids)
+
+
+class InventoryProjector(BackgroundWorker):
+    """
+    Keeps low_stock in line with the ledger.
+
+    Each run reads movements appended since the last one and refreshes
+    low_stock for the books they touch; the first run rebuilds it in full.
+    ``notify`` is called after checkout (applied inline when the thread is
+    not running). books.stock itself is still decremented in the checkout
+    transaction, since the conditional UPDATE is what prevents overselling.
+    """
+
+    name = "inventory-projector"
+
+    def __init__(self, app, interval: float = 30.0, threshold: int = 5):
+        super().__init__(app, interval)
+        self.threshold = threshold
+        self._last_id: Optional[int] = None
+
+    def notify(self) -> None:
+        if self.is_running():
+            self.wake()
+            return
+        try:
+            self.run_once()
+        except (sqlite3.Error, SQLiteOnlyError):
+            # the projection catches up on the next run; never fail the caller
+            logger.exception("%s: inline projection failed", self.name)
+
+    def run_once(self) -> int:
+        db = raw_connection()
+        try:
+            last = db.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_movements").fetchone()[0]
+            if self._last_id is None:
+                refresh_low_stock(db, self.threshold)
+                touched = 1
+            elif last > self._last_id:
+                ids = [
+                    r[0]
+                    for r in db.execute(
+                        "SELECT DISTINCT book_id FROM inventory_movements WHERE id > ? AND id <= ?",
+                        (self._last_id, last),
+                    )
+                ]
+                refresh_low_stock(db, self.threshold, ids)
+                touched = len(ids)
+            else:
+                return 0
+            db.commit()
+            self._last_id = last
+            return touched
+        finally:
+            db.close()
@@ -1,4 +1,8 @@
 """Markdown processing utilities."""
+import hashlib
+import threading
+from collections import OrderedDict
+
 from markdown_it import MarkdownIt
 import bleach
 
@@ -41,3 +45,36 @@ def render_markdown_safe(text: str) -> str:
         strip=True
     )
 
+
+
+# Content-hash LRU for ad-hoc renders (stored review HTML covers page views)
+RENDER_CACHE_SIZE = 512
+_render_cache: "OrderedDict[str, str]" = OrderedDict()
+_render_lock = threading.Lock()
+
+
+def render_markdown_cached(text: str) -> str:
+    """
+    Same output as render_markdown_safe, memoized by SHA-1 of the source.
+
+    Args:
+        text: Markdown text to render
+
+    Returns:
+        Sanitized HTML string
+    """
+    if not text:
+        return ""
+    key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    with _render_lock:
+        html = _render_cache.get(key)
+        if html is not None:
+            _render_cache.move_to_end(key)
+            return html
+    html = render_markdown_safe(text)
+    with _render_lock:
+        _render_cache[key] = html
+        _render_cache.move_to_end(key)
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return html
@@ -0,0 +1,171 @@
+"""Order list views: keyset-paginated, lightweight projection, and streamed exports."""
+import csv
+import io
+import json
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator, List, Optional
+
+from sqlalchemy import and_, func, or_, select
+
+from extensions import db
+from models import Order, OrderItem, User
+from .pagination import decode_cursor, encode_cursor
+
+ORDER_STATUSES = ("pending", "paid", "shipped", "canceled")
+
+# newest first, id breaks ties; backed by (status|user_id, created_at, id) indexes
+_ORDER_KEYSET = {"orders": ("created_at", "DESC")}
+
+
+def list_orders(
+    user_id: Optional[int] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> SimpleNamespace:
+    """
+    One page of orders as plain rows (no ORM graph).
+
+    Rows carry id, user_id, username, status, total, created_at and
+    item_count. Returns a namespace with orders, next_cursor and
+    prev_cursor (None at either end).
+    """
+    item_count = (
+        select(func.count(OrderItem.id))
+        .where(OrderItem.order_id == Order.id)
+        .correlate(Order)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(
+            Order.id,
+            Order.user_id,
+            User.username,
+            Order.status,
+            Order.total,
+            Order.created_at,
+            item_count.label("item_count"),
+        )
+        .select_from(Order)
+        .outerjoin(User, User.id == Order.user_id)
+    )
+    if user_id is not None:
+        stmt = stmt.where(Order.user_id == user_id)
+    if status in ORDER_STATUSES:
+        stmt = stmt.where(Order.status == status)
+
+    backwards = False
+    decoded = decode_cursor(cursor or "", "orders", sorts=_ORDER_KEYSET)
+    if decoded:
+        (key, last_id), backwards = decoded
+        try:
+            key = datetime.fromisoformat(key)
+        except (TypeError, ValueError):
+            # malformed key: serve the first page, as for any bad token
+            decoded, backwards = None, False
+    if decoded:
+        if backwards:
+            stmt = stmt.where(or_(Order.created_at > key, and_(Order.created_at == key, Order.id > last_id)))
+        else:
+            stmt = stmt.where(or_(Order.created_at < key, and_(Order.created_at == key, Order.id < last_id)))
+    if backwards:
+        stmt = stmt.order_by(Order.created_at.asc(), Order.id.asc())
+    else:
+        stmt = stmt.order_by(Order.created_at.desc(), Order.id.desc())
+
+    rows: List = db.session.execute(stmt.limit(limit + 1)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = bool(decoded), more
+    orders = [SimpleNamespace(**row._asdict()) for row in rows]
+
+    def _cursor(order, back: bool) -> str:
+        return encode_cursor("orders", order.created_at.isoformat(sep=" "), order.id, backwards=back)
+
+    return SimpleNamespace(
+        orders=orders,
+        next_cursor=_cursor(orders[-1], False) if orders and has_next else None,
+        prev_cursor=_cursor(orders[0], True) if orders and has_prev else None,
+    )
+
+
+EXPORT_COLUMNS = (
+    "id", "created_at", "user_id", "username", "status", "subtotal", "shipping_fee",
+    "discount", "total", "item_count", "units", "payment_status", "paid_at",
+)
+
+_EXPORT_SQL = """
+    SELECT o.id, o.created_at, o.user_id, u.username, o.status, o.subtotal, o.shipping_fee,
+           o.discount, o.total,
+           (SELECT COUNT(1) FROM order_items oi WHERE oi.order_id = o.id) as item_count,
+           (SELECT COALESCE(SUM(quantity), 0) FROM order_items oi WHERE oi.order_id = o.id) as units,
+           (SELECT status FROM payments p WHERE p.order_id = o.id ORDER BY p.id LIMIT 1) as payment_status,
+           (SELECT paid_at FROM payments p WHERE p.order_id = o.id ORDER BY p.id LIMIT 1) as paid_at
+    FROM orders o LEFT JOIN users u ON u.id = o.user_id
+    WHERE {where}
+    ORDER BY o.created_at, o.id
+"""
+
+
+def iter_order_export(
+    connect: Callable[[], Any],
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    status: Optional[str] = None,
+    chunk_size: int = 1000,
+) -> Iterator[List[tuple]]:
+    """
+    Yield orders in chunks of rows (EXPORT_COLUMNS order), oldest first.
+
+    ``connect`` returns a DBAPI connection (e.g. ``db.engine.raw_connection``)
+    that is opened on first iteration and closed at the end, so it can
+    outlive the request that started a streamed response; the cursor is
+    read with fetchmany so only one chunk is in memory. date_from / date_to are inclusive 'YYYY-MM-DD'
+    (UTC) days.
+    """
+    clauses, params = ["1"], []
+    if date_from:
+        clauses.append("o.created_at >= date(?)")
+        params.append(date_from)
+    if date_to:
+        clauses.append("o.created_at < date(?, '+1 day')")
+        params.append(date_to)
+    if status in ORDER_STATUSES:
+        clauses.append("o.status = ?")
+        params.append(status)
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        cur.execute(_EXPORT_SQL.format(where=" AND ".join(clauses)), params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def export_csv(chunks: Iterator[List[tuple]]) -> Iterator[str]:
+    """CSV text (header first), one yielded string per chunk."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def export_ndjson(chunks: Iterator[List[tuple]]) -> Iterator[str]:
+    """One JSON object per line, one yielded string per chunk."""
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
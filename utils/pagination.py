@@ -0,0 +1,88 @@
+"""Keyset (cursor) pagination helpers for book listings."""
+import json
+import base64
+import hashlib
+from typing import Any, List, Optional, Sequence, Tuple
+
+# sort option -> (key expression, direction); id is always the tie-breaker.
+# Each key has a matching (expr, id) index created in _ensure_database_exists.
+KEYSET_SORTS = {
+    "new": ("created_at", "DESC"),
+    "az": ("title COLLATE NOCASE", "ASC"),
+    "za": ("title COLLATE NOCASE", "DESC"),
+    "price_asc": ("COALESCE(price, 0)", "ASC"),
+    "price_desc": ("COALESCE(price, 0)", "DESC"),
+}
+
+
+def supports_keyset(sort: str) -> bool:
+    return sort in KEYSET_SORTS
+
+
+def order_by_sql(sort: str, reverse: bool = False) -> str:
+    """ORDER BY clause for a keyset sort; reverse=True walks backwards (previous page)."""
+    expr, direction = KEYSET_SORTS[sort]
+    if reverse:
+        direction = "ASC" if direction == "DESC" else "DESC"
+    return f" ORDER BY {expr} {direction}, id {direction}"
+
+
+def seek_sql(sort: str, backwards: bool = False) -> str:
+    """
+    Condition selecting rows after (or before) the cursor position.
+
+    Spelled out instead of a row value: SQLite only turns the leading
+    ``key >= ?`` term into an index range for collated/expression keys.
+    Binds seek_params(key, id).
+    """
+    expr, direction = KEYSET_SORTS[sort]
+    op = "<" if direction == "DESC" else ">"
+    if backwards:
+        op = ">" if op == "<" else "<"
+    return f"({expr} {op}= ? AND ({expr} {op} ? OR id {op} ?))"
+
+
+def seek_params(key: Any, row_id: int) -> list:
+    return [key, key, row_id]
+
+
+def sort_key_sql(sort: str) -> str:
+    """Select-list expression returning the key value the cursor is built from."""
+    return KEYSET_SORTS[sort][0]
+
+
+def encode_cursor(sort: str, key: Any, row_id: int, backwards: bool = False) -> str:
+    payload = {"s": sort, "k": [key, row_id]}
+    if backwards:
+        payload["b"] = 1
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort: str, sorts: Optional[dict] = None) -> Optional[Tuple[List[Any], bool]]:
+    """
+    Decode a cursor token issued for this sort.
+
+    ``sorts`` is the table of valid sort names (the /books ones by default).
+    Returns ([key, id], backwards) or None for a missing, malformed or
+    foreign-sort token, or one whose key is not a scalar the database can
+    bind (callers then start from the first page).
+    """
+    if not token or sort not in (KEYSET_SORTS if sorts is None else sorts):
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        key, row_id = payload["k"]
+        if payload.get("s") != sort or not isinstance(key, (str, int, float, type(None))):
+            return None
+        return [key, int(row_id)], bool(payload.get("b"))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def count_cache_key(prefix: str, parts: Sequence[Any]) -> str:
+    """Stable cache key for a filter signature (SQL fragments + bound params)."""
+    digest = hashlib.sha1(json.dumps(list(parts), default=str, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return f"{prefix}:{digest}"
+
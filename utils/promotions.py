@@ -0,0 +1,177 @@
+"""Promotions: rules compiled into an in-process index and applied to priced carts."""
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROMOTION_KINDS = ("percent", "amount", "free_ship")
+PROMOTION_SCOPES = ("all", "category", "book")
+
+# kind: percent (value = % off eligible lines), amount (value off eligible lines,
+# capped at their total) or free_ship; scope: all lines, one category or one book
+PROMOTIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS promotions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL CHECK (kind IN ('percent', 'amount', 'free_ship')),
+    value REAL NOT NULL DEFAULT 0,
+    scope TEXT NOT NULL DEFAULT 'all' CHECK (scope IN ('all', 'category', 'book')),
+    target_id INTEGER,
+    coupon_code TEXT UNIQUE,
+    min_subtotal REAL NOT NULL DEFAULT 0,
+    starts_at DATETIME,
+    ends_at DATETIME,
+    is_active INTEGER NOT NULL DEFAULT 1,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def normalize_coupon(code: Optional[str]) -> Optional[str]:
+    code = (code or "").strip().upper()
+    return code[:40] or None
+
+
+def _parse_dt(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("T", " "))
+    except ValueError:
+        return None
+
+
+def _in_window(rule: SimpleNamespace, now: datetime) -> bool:
+    """starts_at <= now < ends_at (open ends allowed); times are UTC like CURRENT_TIMESTAMP."""
+    return not ((rule.starts_at and rule.starts_at > now) or (rule.ends_at and rule.ends_at <= now))
+
+
+class PromotionIndex:
+    """
+    Active promotions compiled once per process and reused until invalidated.
+
+    Rules are bucketed by book id, category id and "all", and coupon rules
+    are keyed by code, so ``apply`` only looks at the buckets of the cart's
+    lines. Admin promotion routes call ``invalidate()``; ``max_age`` bounds
+    how long another worker process keeps a stale copy, and also picks up
+    rules whose start time has passed.
+    """
+
+    def __init__(self, max_age: float = 60.0):
+        self.max_age = max_age
+        self.version = 0
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._by_book: Dict[int, List[SimpleNamespace]] = {}
+        self._by_category: Dict[int, List[SimpleNamespace]] = {}
+        self._global: List[SimpleNamespace] = []
+        self._coupons: Dict[str, List[SimpleNamespace]] = {}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure(self, db: sqlite3.Connection) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.max_age:
+            return
+        rows = db.execute(
+            """SELECT id, name, kind, value, scope, target_id, coupon_code, min_subtotal, starts_at, ends_at
+               FROM promotions
+               WHERE is_active = 1 AND (ends_at IS NULL OR ends_at > CURRENT_TIMESTAMP)"""
+        ).fetchall()
+        by_book: Dict[int, List[SimpleNamespace]] = {}
+        by_category: Dict[int, List[SimpleNamespace]] = {}
+        global_rules: List[SimpleNamespace] = []
+        coupons: Dict[str, List[SimpleNamespace]] = {}
+        for r in rows:
+            rule = SimpleNamespace(
+                id=r[0], name=r[1], kind=r[2], value=float(r[3] or 0), scope=r[4], target_id=r[5],
+                coupon=normalize_coupon(r[6]), min_subtotal=float(r[7] or 0),
+                starts_at=_parse_dt(r[8]), ends_at=_parse_dt(r[9]),
+            )
+            if rule.coupon:
+                coupons.setdefault(rule.coupon, []).append(rule)
+            elif rule.scope == "book" and rule.target_id is not None:
+                by_book.setdefault(int(rule.target_id), []).append(rule)
+            elif rule.scope == "category" and rule.target_id is not None:
+                by_category.setdefault(int(rule.target_id), []).append(rule)
+            else:
+                global_rules.append(rule)
+        with self._lock:
+            self._by_book = by_book
+            self._by_category = by_category
+            self._global = global_rules
+            self._coupons = coupons
+            self._loaded_at = time.monotonic()
+            self.version += 1
+
+    def has_coupon(self, db: sqlite3.Connection, code: Optional[str]) -> bool:
+        """True if ``code`` belongs to an active rule inside its validity window now."""
+        self._ensure(db)
+        now = datetime.utcnow()
+        return any(_in_window(rule, now) for rule in self._coupons.get(normalize_coupon(code), []))
+
+    def apply(self, db: sqlite3.Connection, lines: List[dict], subtotal: float, coupon: Optional[str] = None) -> SimpleNamespace:
+        """
+        Best promotion for priced cart lines (see utils.cart.price_cart).
+
+        Promotions do not stack: the rule with the largest discount wins,
+        and any applicable free_ship rule waives shipping on top of it.
+        Returns a namespace with discount, free_shipping, applied (rule
+        names) and coupon (the normalized code if it matched a rule).
+        """
+        self._ensure(db)
+        now = datetime.utcnow()
+        code = normalize_coupon(coupon)
+        coupon_rules = [r for r in self._coupons.get(code, []) if _in_window(r, now)] if code else []
+
+        eligible: Dict[int, float] = {}
+        rules: Dict[int, SimpleNamespace] = {}
+
+        def _scoped(rule, line) -> bool:
+            if rule.scope == "book":
+                return rule.target_id == line["id"]
+            if rule.scope == "category":
+                return rule.target_id == line.get("category_id")
+            return True
+
+        for line in lines:
+            candidates = self._global + self._by_book.get(line["id"], [])
+            if line.get("category_id") is not None:
+                candidates = candidates + self._by_category.get(line["category_id"], [])
+            for rule in candidates + [r for r in coupon_rules if _scoped(r, line)]:
+                rules[rule.id] = rule
+                eligible[rule.id] = eligible.get(rule.id, 0.0) + line["line_total"]
+
+        best, best_discount, free_ship = None, 0.0, None
+        for rule_id, amount in eligible.items():
+            rule = rules[rule_id]
+            if subtotal < rule.min_subtotal:
+                continue
+            if not _in_window(rule, now):
+                continue
+            if rule.kind == "free_ship":
+                free_ship = free_ship or rule
+                continue
+            if rule.kind == "percent":
+                discount = amount * min(max(rule.value, 0), 100) / 100
+            else:
+                discount = min(max(rule.value, 0), amount)
+            if discount > best_discount:
+                best, best_discount = rule, discount
+
+        applied = [r.name for r in (best, free_ship) if r is not None]
+        matched = any(r is best or r is free_ship for r in coupon_rules)
+        return SimpleNamespace(
+            discount=round(min(best_discount, subtotal)),
+            free_shipping=free_ship is not None,
+            applied=applied,
+            coupon=code if code and coupon_rules else None,
+            coupon_applied=matched,
+        )
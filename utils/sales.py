@@ -0,0 +1,130 @@
+"""Daily sales rollups (per day, per book, per category) for the admin dashboard."""
+import sqlite3
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+# dimension: 'total' (dim_id 0), 'book' (books.id) or 'category' (categories.id, 0 = uncategorized)
+DAILY_SALES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_sales (
+    day TEXT NOT NULL,
+    dimension TEXT NOT NULL CHECK (dimension IN ('total', 'book', 'category')),
+    dim_id INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    orders INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, day, dim_id)
+);
+"""
+
+# Days are UTC calendar days of orders.created_at. 'total' revenue is orders.total
+# (shipping and discounts included); book/category revenue is the sum of line totals.
+_ROLLUP_SELECTS = {
+    "total": """
+        SELECT date(o.created_at), 'total', 0, {sign} SUM(o.total), {sign} COUNT(1),
+               {sign} SUM(COALESCE((SELECT SUM(quantity) FROM order_items WHERE order_id = o.id), 0))
+        FROM orders o WHERE {where} GROUP BY date(o.created_at)
+    """,
+    "book": """
+        SELECT date(o.created_at), 'book', oi.book_id, {sign} SUM(oi.line_total),
+               {sign} COUNT(DISTINCT o.id), {sign} SUM(oi.quantity)
+        FROM order_items oi JOIN orders o ON o.id = oi.order_id
+        WHERE {where} GROUP BY date(o.created_at), oi.book_id
+    """,
+    "category": """
+        SELECT date(o.created_at), 'category', COALESCE(b.category_id, 0), {sign} SUM(oi.line_total),
+               {sign} COUNT(DISTINCT o.id), {sign} SUM(oi.quantity)
+        FROM order_items oi JOIN orders o ON o.id = oi.order_id LEFT JOIN books b ON b.id = oi.book_id
+        WHERE {where} GROUP BY date(o.created_at), COALESCE(b.category_id, 0)
+    """,
+}
+
+_UPSERT = """
+    INSERT INTO daily_sales (day, dimension, dim_id, revenue, orders, units)
+    {select}
+    ON CONFLICT(dimension, day, dim_id) DO UPDATE SET
+        revenue = daily_sales.revenue + excluded.revenue,
+        orders = daily_sales.orders + excluded.orders,
+        units = daily_sales.units + excluded.units
+"""
+
+
+def counts_as_sale(status) -> bool:
+    """Every order counts towards sales except canceled ones."""
+    return status != "canceled"
+
+
+def _statements(where: str, sign: str):
+    return [_UPSERT.format(select=sql.format(where=where, sign=sign)) for sql in _ROLLUP_SELECTS.values()]
+
+
+def apply_order_sales(session, order_id: int, sign: int = 1) -> None:
+    """
+    Add (sign=1) or remove (sign=-1) one order's contribution to daily_sales.
+
+    Runs inside the caller's SQLAlchemy transaction, after the order and
+    its items are flushed; call it whenever an order enters or leaves the
+    counted set (see counts_as_sale). The caller commits.
+    """
+    sign_sql = "-" if sign < 0 else ""
+    for sql in _statements("o.id = :order_id", sign_sql):
+        session.execute(text(sql), {"order_id": int(order_id)})
+
+
+def sync_order_status(session, order, new_status: str) -> None:
+    """Set order.status and move the order in or out of the rollups if needed."""
+    was, now = counts_as_sale(order.status), counts_as_sale(new_status)
+    order.status = new_status
+    if was != now:
+        apply_order_sales(session, order.id, 1 if now else -1)
+
+
+def rebuild_daily_sales(db: sqlite3.Connection) -> None:
+    """Recompute daily_sales from all orders (backfill / repair). The caller commits."""
+    db.execute("DELETE FROM daily_sales")
+    for sql in _statements("o.status != 'canceled'", ""):
+        db.execute(sql)
+
+
+def load_sales_dashboard(db: sqlite3.Connection, days: int = 30, top: int = 10) -> SimpleNamespace:
+    """
+    Dashboard data for the last ``days`` days, read from daily_sales only
+    (plus a primary-key lookup of the top books/categories' names).
+    """
+    since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    daily = db.execute(
+        "SELECT day, revenue, orders, units FROM daily_sales WHERE dimension = 'total' AND day >= ? ORDER BY day DESC",
+        (since,),
+    ).fetchall()
+    top_books = db.execute(
+        """
+        SELECT s.dim_id as book_id, b.title, s.revenue, s.orders, s.units FROM (
+            SELECT dim_id, SUM(revenue) as revenue, SUM(orders) as orders, SUM(units) as units
+            FROM daily_sales WHERE dimension = 'book' AND day >= ?
+            GROUP BY dim_id HAVING SUM(units) > 0 ORDER BY revenue DESC LIMIT ?
+        ) s LEFT JOIN books b ON b.id = s.dim_id
+        ORDER BY s.revenue DESC
+        """,
+        (since, top),
+    ).fetchall()
+    top_categories = db.execute(
+        """
+        SELECT s.dim_id as category_id, c.name, s.revenue, s.orders, s.units FROM (
+            SELECT dim_id, SUM(revenue) as revenue, SUM(orders) as orders, SUM(units) as units
+            FROM daily_sales WHERE dimension = 'category' AND day >= ?
+            GROUP BY dim_id HAVING SUM(units) > 0 ORDER BY revenue DESC LIMIT ?
+        ) s LEFT JOIN categories c ON c.id = s.dim_id
+        ORDER BY s.revenue DESC
+        """,
+        (since, top),
+    ).fetchall()
+    return SimpleNamespace(
+        days=days,
+        daily=daily,
+        top_books=top_books,
+        top_categories=top_categories,
+        revenue=sum(r["revenue"] or 0 for r in daily),
+        orders=sum(r["orders"] or 0 for r in daily),
+        units=sum(r["units"] or 0 for r in daily),
+    )
@@ -0,0 +1,121 @@
+"""Precomputed trending scores (book_scores table)."""
+import random
+import sqlite3
+import logging
+from typing import Iterable, List, Optional
+
+from flask import current_app
+
+from .cache import SCORE_SECTIONS, invalidate_sections
+from .db import raw_connection
+from .workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+# Random bonus (0..DIVERSITY_JITTER) added per request so the section does not
+# always show the same books; matches the old ABS(RANDOM()) % 100 term.
+DIVERSITY_JITTER = 100
+
+# Comparisons are against the raw column (no datetime() wrapper) so the
+# created_at indexes stay usable.
+_REFRESH_SQL = """
+INSERT INTO book_scores (book_id, bookmark_score_30d, review_score, newness, base_score, updated_at)
+SELECT id, bookmark_score_30d, review_score, newness,
+       bookmark_score_30d + review_score + newness, CURRENT_TIMESTAMP
+FROM (
+    SELECT b.id,
+           COALESCE(bm.c, 0) * 2 AS bookmark_score_30d,
+           COALESCE(rv.c, 0) * 1.5 AS review_score,
+           CASE WHEN b.created_at >= datetime('now','-7 day') THEN 10
+                WHEN b.created_at >= datetime('now','-30 day') THEN 5
+                ELSE 0 END AS newness
+    FROM books b
+    LEFT JOIN (
+        SELECT book_id, COUNT(*) AS c FROM bookmarks
+        WHERE created_at >= datetime('now','-30 day'){bm_filter}
+        GROUP BY book_id
+    ) bm ON bm.book_id = b.id
+    LEFT JOIN (
+        SELECT book_id, COUNT(*) AS c FROM reviews
+        WHERE status = 'approved'{rv_filter}
+        GROUP BY book_id
+    ) rv ON rv.book_id = b.id
+    WHERE (b.is_active IS NULL OR b.is_active=1){b_filter}
+)
+WHERE 1
+ON CONFLICT(book_id) DO UPDATE SET
+    bookmark_score_30d = excluded.bookmark_score_30d,
+    review_score = excluded.review_score,
+    newness = excluded.newness,
+    base_score = excluded.base_score,
+    updated_at = excluded.updated_at
+"""
+
+
+def refresh_book_scores(db: sqlite3.Connection, book_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Recompute book_scores for the given books (or the whole catalog).
+
+    Inactive or deleted books lose their row. The caller commits.
+    """
+    if book_ids is None:
+        db.execute(_REFRESH_SQL.format(bm_filter="", rv_filter="", b_filter=""))
+        db.execute(
+            "DELETE FROM book_scores WHERE book_id NOT IN "
+            "(SELECT id FROM books WHERE is_active IS NULL OR is_active=1)"
+        )
+        return
+    ids = sorted({int(i) for i in book_ids if i is not None})
+    if not ids:
+        return
+    qmarks = ",".join(["?"] * len(ids))
+    flt = f" AND book_id IN ({qmarks})"
+    db.execute(
+        _REFRESH_SQL.format(bm_filter=flt, rv_filter=flt, b_filter=f" AND b.id IN ({qmarks})"),
+        ids * 3,
+    )
+    db.execute(
+        f"DELETE FROM book_scores WHERE book_id IN ({qmarks}) AND book_id NOT IN "
+        f"(SELECT id FROM books WHERE id IN ({qmarks}) AND (is_active IS NULL OR is_active=1))",
+        ids * 2,
+    )
+
+
+def trending_candidates(db: sqlite3.Connection, limit: int) -> List[dict]:
+    """Top books by precomputed score, read through the base_score index."""
+    rows = db.execute(
+        """
+        SELECT b.id, b.title, b.author, b.cover_url, COALESCE(b.genre,'Khác') as genre, b.description, b.book_code,
+               s.base_score
+        FROM book_scores s
+        JOIN books b ON b.id = s.book_id
+        ORDER BY s.base_score DESC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def pick_trending(candidates: List[dict], n: int, rng: Optional[random.Random] = None) -> List[dict]:
+    """Apply the diversity jitter over the candidate set and keep the best n."""
+    rng = rng or random
+    scored = [(c["base_score"] + rng.randrange(DIVERSITY_JITTER), c) for c in candidates]
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [dict(c, total_score=score) for score, c in scored[:n]]
+
+
+class BookScoreWorker(BackgroundWorker):
+    """Periodic full refresh so time-based terms (30-day bookmarks, newness) decay."""
+
+    name = "book-scores"
+
+    def run_once(self) -> int:
+        db = raw_connection()
+        try:
+            refresh_book_scores(db)
+            db.commit()
+        finally:
+            db.close()
+        invalidate_sections(getattr(current_app, "cache", None), SCORE_SECTIONS)
+        return 1
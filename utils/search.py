@@ -0,0 +1,131 @@
+"""Full-text search over books (SQLite FTS5)."""
+import re
+import sqlite3
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# bm25 column weights: title, author, description, book_code, publisher, tags
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 8.0, 2.0, 3.0)
+BM25_EXPR = "bm25(books_fts, {})".format(", ".join(str(w) for w in BM25_WEIGHTS))
+
+# unicode61 with remove_diacritics=2 folds Vietnamese tone marks (ư, ơ, ắ, ...)
+# but not the stroke letter đ/Đ, so triggers and queries replace it explicitly.
+
+
+def _fold_sql(expr: str) -> str:
+    return f"replace(replace(COALESCE({expr}, ''), 'đ', 'd'), 'Đ', 'D')"
+
+
+def _tags_sql(book_id_expr: str) -> str:
+    return (
+        "(SELECT group_concat(t.name, ' ') FROM book_tags bt JOIN tags t ON t.id = bt.tag_id "
+        f"WHERE bt.book_id = {book_id_expr})"
+    )
+
+
+def _row_values(ref: str) -> str:
+    cols = ("title", "author", "description", "book_code", "publisher")
+    values = [f"{ref}.id"] + [_fold_sql(f"{ref}.{c}") for c in cols] + [_fold_sql(_tags_sql(f"{ref}.id"))]
+    return ", ".join(values)
+
+
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    title, author, description, book_code, publisher, tags,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts (rowid, title, author, description, book_code, publisher, tags)
+    SELECT {_row_values('new')};
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, description, book_code, publisher ON books BEGIN
+    DELETE FROM books_fts WHERE rowid = old.id;
+    INSERT INTO books_fts (rowid, title, author, description, book_code, publisher, tags)
+    SELECT {_row_values('new')};
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+    DELETE FROM books_fts WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS book_tags_fts_ai AFTER INSERT ON book_tags BEGIN
+    UPDATE books_fts SET tags = {_fold_sql(_tags_sql('new.book_id'))} WHERE rowid = new.book_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS book_tags_fts_ad AFTER DELETE ON book_tags BEGIN
+    UPDATE books_fts SET tags = {_fold_sql(_tags_sql('old.book_id'))} WHERE rowid = old.book_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tags_fts_au AFTER UPDATE OF name ON tags BEGIN
+    UPDATE books_fts SET tags = {_fold_sql(_tags_sql('books_fts.rowid'))}
+    WHERE rowid IN (SELECT book_id FROM book_tags WHERE tag_id = new.id);
+END;
+"""
+
+
+def ensure_search_index(db: sqlite3.Connection) -> bool:
+    """Create the FTS table and triggers; rebuild if out of step with books. Returns False without FTS5."""
+    try:
+        db.executescript(SEARCH_SCHEMA)
+    except sqlite3.OperationalError as exc:
+        logger.warning("FTS5 not available, search falls back to LIKE: %s", exc)
+        return False
+    indexed = db.execute("SELECT COUNT(1) FROM books_fts").fetchone()[0]
+    total = db.execute("SELECT COUNT(1) FROM books").fetchone()[0]
+    if indexed != total:
+        rebuild_search_index(db)
+    db.commit()
+    return True
+
+
+def rebuild_search_index(db: sqlite3.Connection) -> None:
+    db.execute("DELETE FROM books_fts")
+    db.execute(
+        "INSERT INTO books_fts (rowid, title, author, description, book_code, publisher, tags) "
+        f"SELECT {_row_values('b')} FROM books b"
+    )
+
+
+def search_index_available(db: sqlite3.Connection) -> bool:
+    row = db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='books_fts'").fetchone()
+    return bool(row)
+
+
+def fold_text(text: str) -> str:
+    """Query-side folding matching the index (đ -> d; the tokenizer handles the rest)."""
+    return (text or "").replace("đ", "d").replace("Đ", "D")
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word must match as a prefix, e.g. "tu duy" -> '"tu"* "duy"*'.
+    Returns None when the text has no searchable words.
+    """
+    words = re.findall(r"\w+", fold_text(q), flags=re.UNICODE)
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_books(db: sqlite3.Connection, q: str, limit: int = 20) -> List[sqlite3.Row]:
+    """Active books matching q, best bm25 rank first."""
+    match = build_match_query(q)
+    if match is None:
+        return []
+    return db.execute(
+        f"""
+        SELECT b.id, b.title, b.author, b.cover_url, b.description, b.genre
+        FROM books_fts
+        JOIN books b ON b.id = books_fts.rowid
+        WHERE books_fts MATCH ? AND (b.is_active IS NULL OR b.is_active=1)
+        ORDER BY {BM25_EXPR}
+        LIMIT ?
+        """,
+        (match, limit),
+    ).fetchall()
@@ -0,0 +1,35 @@
+"""User shelves (read / reading / want_to_read) loaded in one pass."""
+import sqlite3
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+SHELF_TYPES = ("want_to_read", "reading", "read")
+
+
+def load_shelves(db: sqlite3.Connection, user_id: int, per_shelf: Optional[int] = None) -> SimpleNamespace:
+    """
+    All of a user's shelves from one query on (user_id, shelf_type, added_at).
+
+    Rows are newest first within each shelf; ``per_shelf`` keeps only the
+    first N of each (ROW_NUMBER window), while ``counts`` is the full size
+    of every shelf from the same pass. Returns a namespace with ``rows``
+    ({shelf_type: [{book_id, added_at}]}) and ``counts`` ({shelf_type: n}).
+    """
+    cur = db.execute(
+        """
+        SELECT shelf_type, book_id, added_at, shelf_count FROM (
+            SELECT shelf_type, book_id, added_at,
+                   ROW_NUMBER() OVER (PARTITION BY shelf_type ORDER BY added_at DESC, book_id DESC) AS rn,
+                   COUNT(1) OVER (PARTITION BY shelf_type) AS shelf_count
+            FROM user_shelves WHERE user_id = ?
+        ) WHERE ? IS NULL OR rn <= ?
+        ORDER BY shelf_type, rn
+        """,
+        (int(user_id), per_shelf, per_shelf),
+    )
+    rows: Dict[str, List[dict]] = {t: [] for t in SHELF_TYPES}
+    counts: Dict[str, int] = {t: 0 for t in SHELF_TYPES}
+    for shelf_type, book_id, added_at, shelf_count in cur.fetchall():
+        rows.setdefault(shelf_type, []).append({"book_id": book_id, "added_at": added_at})
+        counts[shelf_type] = shelf_count
+    return SimpleNamespace(rows=rows, counts=counts)
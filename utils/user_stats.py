@@ -0,0 +1,127 @@
+"""Per-user counters (follows, shelves, approved reviews) kept next to the writes."""
+import sqlite3
+import logging
+from typing import Dict, Iterable, Optional
+
+from .db import raw_connection
+from .workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+SHELF_COUNTERS = {"read": "shelf_read", "reading": "shelf_reading", "want_to_read": "shelf_want_to_read"}
+STAT_COLUMNS = ("followers", "following", "shelf_read", "shelf_reading", "shelf_want_to_read", "reviews")
+
+USER_STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    followers INTEGER NOT NULL DEFAULT 0,
+    following INTEGER NOT NULL DEFAULT 0,
+    shelf_read INTEGER NOT NULL DEFAULT 0,
+    shelf_reading INTEGER NOT NULL DEFAULT 0,
+    shelf_want_to_read INTEGER NOT NULL DEFAULT 0,
+    reviews INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+_ACTUAL_STATS = """
+SELECT u.id,
+       COALESCE(fr.n, 0), COALESCE(fg.n, 0),
+       COALESCE(sh.n_read, 0), COALESCE(sh.n_reading, 0), COALESCE(sh.n_want, 0),
+       COALESCE(rv.n, 0)
+FROM users u
+LEFT JOIN (SELECT following_id AS user_id, COUNT(1) AS n FROM user_follows GROUP BY following_id) fr ON fr.user_id = u.id
+LEFT JOIN (SELECT follower_id AS user_id, COUNT(1) AS n FROM user_follows GROUP BY follower_id) fg ON fg.user_id = u.id
+LEFT JOIN (
+    SELECT user_id,
+           SUM(CASE WHEN shelf_type = 'read' THEN 1 ELSE 0 END) AS n_read,
+           SUM(CASE WHEN shelf_type = 'reading' THEN 1 ELSE 0 END) AS n_reading,
+           SUM(CASE WHEN shelf_type = 'want_to_read' THEN 1 ELSE 0 END) AS n_want
+    FROM user_shelves GROUP BY user_id
+) sh ON sh.user_id = u.id
+LEFT JOIN (SELECT user_id, COUNT(1) AS n FROM reviews WHERE status = 'approved' GROUP BY user_id) rv ON rv.user_id = u.id
+"""
+
+
+def bump_user_stats(db: sqlite3.Connection, user_id: Optional[int], **deltas: int) -> None:
+    """Add ``deltas`` (column=+/-n) to a user's counters in the caller's transaction."""
+    deltas = {col: int(n) for col, n in deltas.items() if n}
+    if user_id is None or not deltas:
+        return
+    unknown = set(deltas) - set(STAT_COLUMNS)
+    if unknown:
+        raise ValueError(f"unknown user_stats columns: {sorted(unknown)}")
+    cols = list(deltas)
+    db.execute(
+        f"""
+        INSERT INTO user_stats (user_id, {", ".join(cols)}) VALUES (?{", ?" * len(cols)})
+        ON CONFLICT(user_id) DO UPDATE SET
+            {", ".join(f"{c} = MAX(0, {c} + ?)" for c in cols)},
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        [int(user_id)] + [max(0, deltas[c]) for c in cols] + [deltas[c] for c in cols],
+    )
+
+
+def bump_review_count(db: sqlite3.Connection, review_id: int, prev_status: Optional[str], new_status: str) -> None:
+    """Adjust the author's approved-review counter for a moderation status change."""
+    delta = (new_status == "approved") - (prev_status == "approved")
+    if not delta:
+        return
+    row = db.execute("SELECT user_id FROM reviews WHERE id = ?", (int(review_id),)).fetchone()
+    if row:
+        bump_user_stats(db, row[0], reviews=delta)
+
+
+def get_user_stats(db: sqlite3.Connection, user_id: int) -> Dict[str, int]:
+    row = db.execute(f"SELECT {', '.join(STAT_COLUMNS)} FROM user_stats WHERE user_id = ?", (int(user_id),)).fetchone()
+    if row is None:
+        return {col: 0 for col in STAT_COLUMNS}
+    return {col: max(0, int(row[i] or 0)) for i, col in enumerate(STAT_COLUMNS)}
+
+
+def reconcile_user_stats(db: sqlite3.Connection, user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute counters from the source tables and fix rows that drifted.
+
+    Also creates missing rows (the initial backfill). The caller commits.
+    Returns the number of rows written.
+    """
+    sql = _ACTUAL_STATS
+    params: list = []
+    if user_ids is not None:
+        ids = sorted({int(i) for i in user_ids})
+        if not ids:
+            return 0
+        sql += f" WHERE u.id IN ({','.join(['?'] * len(ids))})"
+        params = ids
+    cols = ", ".join(STAT_COLUMNS)
+    cur = db.execute(
+        f"""
+        INSERT INTO user_stats (user_id, {cols})
+        SELECT * FROM ({sql}) WHERE true
+        ON CONFLICT(user_id) DO UPDATE SET
+            {", ".join(f"{c} = excluded.{c}" for c in STAT_COLUMNS)},
+            updated_at = CURRENT_TIMESTAMP
+        WHERE {" OR ".join(f"{c} != excluded.{c}" for c in STAT_COLUMNS)}
+        """,
+        params,
+    )
+    return cur.rowcount
+
+
+class UserStatsReconciler(BackgroundWorker):
+    """Periodically recomputes user_stats, absorbing writes made outside the routes."""
+
+    name = "user-stats"
+
+    def run_once(self) -> int:
+        db = raw_connection()
+        try:
+            fixed = reconcile_user_stats(db)
+            db.commit()
+        finally:
+            db.close()
+        if fixed:
+            logger.info("%s: corrected %d user_stats rows", self.name, fixed)
+        return fixed
@@ -0,0 +1,71 @@
+"""Background worker helpers."""
+import os
+import abc
+import logging
+import threading
+from typing import Optional
+
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+def should_start_workers(app: Flask) -> bool:
+    """Only start workers in the serving process (not in the debug reloader parent)."""
+    if app.config.get("TESTING"):
+        return False
+    if app.debug:
+        return os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    return True
+
+
+class BackgroundWorker(abc.ABC):
+    """
+    Daemon thread that calls ``run_once`` inside an app context.
+
+    Runs every ``interval`` seconds, or immediately after ``wake()``.
+    Subclasses implement ``run_once``.
+    """
+
+    name = "background-worker"
+
+    def __init__(self, app: Flask, interval: float = 60.0):
+        self.app = app
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "BackgroundWorker":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def wake(self) -> None:
+        """Ask the worker to run as soon as possible."""
+        self._wake.set()
+
+    @abc.abstractmethod
+    def run_once(self) -> int:
+        """Do one batch of work; returns the number of items handled."""
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_once()
+            except Exception:
+                logger.exception("%s: run failed", self.name)
+            self._wake.wait(self.interval)
+            self._wake.clear()